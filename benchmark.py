@@ -0,0 +1,242 @@
+import os
+import re
+import sys
+import time
+import json
+import argparse
+import difflib
+from typing import List
+
+from config import VECTOR_DB_PATH, COLLECTION_NAME, FLAT_INDEX_RESCORE
+
+
+PDF_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pdf")
+
+
+def _normalize(text: str) -> str:
+    # 去掉页码标记与空白差异，只比较正文
+    text = re.sub(r"--- 第 \d+ 页 ---", "", text)
+    return "".join(text.split())
+
+
+def bench_pdf(args) -> None:
+    """对比 PDF 解析后端的速度 (pages/sec) 与文本一致性"""
+    from document_loader import DocumentLoader
+
+    pdf_files: List[str] = []
+    for root, _, files in os.walk(args.fixtures):
+        pdf_files.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".pdf"))
+    if not pdf_files:
+        print(f"未在 {args.fixtures} 下找到 PDF 文件")
+        return
+
+    outputs = {}
+    for backend in ("pdfplumber", "pymupdf"):
+        loader = DocumentLoader(data_dir=args.fixtures, cache_dir=None, pdf_backend=backend)
+        pages, fallback_pages, per_file = 0, 0, {}
+        start = time.perf_counter()
+        for path in pdf_files:
+            result = loader.load_pdf(path)
+            per_file[path] = [r["text"] for r in result]
+            pages += len(result)
+            fallback_pages += loader.pdf_fallback_pages
+        elapsed = time.perf_counter() - start
+        outputs[backend] = per_file
+        print(f"[{loader.pdf_backend:>10}] {pages} 页, {elapsed:.2f}s, {pages / max(elapsed, 1e-9):.1f} pages/sec, 回退 {fallback_pages} 页")
+
+    ratios = []
+    for path in pdf_files:
+        ref_pages, fast_pages = outputs["pdfplumber"][path], outputs["pymupdf"][path]
+        if len(ref_pages) != len(fast_pages):
+            print(f"页数不一致: {path} ({len(ref_pages)} vs {len(fast_pages)})")
+        for ref, fast in zip(ref_pages, fast_pages):
+            ref, fast = _normalize(ref), _normalize(fast)
+            if not ref and not fast:
+                ratios.append(1.0)
+            else:
+                ratios.append(difflib.SequenceMatcher(None, ref, fast, autojunk=False).ratio())
+    if ratios:
+        ratios.sort()
+        print(f"文本一致性 (字符级相似度): 平均 {sum(ratios) / len(ratios):.3f}, 最低 {ratios[0]:.3f}, "
+              f"P10 {ratios[len(ratios) // 10]:.3f}, 低于0.9的页 {sum(r < 0.9 for r in ratios)}/{len(ratios)}")
+
+
+def bench_vector(args) -> None:
+    """对比 ChromaDB 与扁平索引 (float16 / int8) 的查询延迟、内存与召回率
+
+    查询向量取自库中已有向量并加入噪声，不需要调用 Embedding API；
+    召回率以 float32 精确暴力检索的 top-k 为基准。
+    """
+    import tempfile
+    import numpy as np
+    import chromadb
+    from chromadb.config import Settings
+    from flat_index import FlatIndex
+
+    client = chromadb.PersistentClient(path=args.db_path, settings=Settings(anonymized_telemetry=False))
+    collection = client.get_collection(name=args.collection)
+    data = collection.get(include=["embeddings"])
+    ids = list(data["ids"])
+    if not ids:
+        print("向量数据库为空")
+        return
+    matrix = np.asarray(data["embeddings"], dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    by_id = {doc_id: matrix[i] for i, doc_id in enumerate(ids)}
+    print(f"{len(ids)} 个向量, 维度 {matrix.shape[1]}, float32 原始大小 {matrix.nbytes / 2**20:.1f} MiB")
+
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+    queries = matrix[picks] + args.noise * rng.standard_normal((len(picks), matrix.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [set(np.argsort(-(matrix @ q))[:args.top_k]) for q in queries]
+    row_of = {doc_id: i for i, doc_id in enumerate(ids)}
+
+    def report(name, search, memory_bytes):
+        recalls, latencies = [], []
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            rows = search(q)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(expected & set(rows)) / args.top_k)
+        latencies.sort()
+        print(f"[{name:>16}] p50 {latencies[len(latencies) // 2] * 1000:.2f}ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms, "
+              f"recall@{args.top_k} {sum(recalls) / len(recalls):.4f}, 索引 {memory_bytes / 2**20:.1f} MiB")
+
+    # ChromaDB 的 HNSW 图另有开销，这里只记 float32 原始向量大小作为下限
+    report("chroma", lambda q: [row_of[i] for i in collection.query(query_embeddings=[q.tolist()], n_results=args.top_k)["ids"][0]], matrix.nbytes)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype, rescore in (("float16", 1), ("int8", 1), ("int8", FLAT_INDEX_RESCORE)):
+            index = FlatIndex(tmp, dtype=dtype)
+            if not index.load():
+                index.build(ids, matrix)
+            fetch = (lambda xs: [by_id[x] for x in xs]) if rescore > 1 else None
+            name = f"flat-{dtype}" + (f"-rescore{rescore}" if rescore > 1 else "")
+            report(name, lambda q: [row for row, _ in index.search(q, args.top_k, rescore, fetch)], index.memory_bytes())
+
+
+def _rss_bytes() -> int:
+    """当前进程常驻内存 (Linux 读取 /proc，其他平台退化为峰值 RSS)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _synthetic_corpus(n: int):
+    import random
+    rng = random.Random(0)
+    words = ["机器学习", "神经网络", "梯度下降", "损失函数", "反向传播", "卷积", "注意力机制", "语言模型",
+             "transformer", "embedding", "softmax", "正则化", "过拟合", "数据集", "优化器", "参数"]
+    filenames = [f"lecture{i:02d}.pdf" for i in range(40)]
+    for i in range(n):
+        text = "".join(rng.choice(words) + rng.choice("，。 ") for _ in range(rng.randint(60, 160)))
+        filename = filenames[i % len(filenames)]
+        meta = {"filename": filename, "filepath": f"./data/{filename}", "filetype": ".pdf",
+                "page_number": i // 8 + 1, "chunk_id": i % 8}
+        # 与去重后的真实数据一致：约 10% 的块合并了其他文件中的重复块，带有 sources / duplicate_count
+        if rng.random() < 0.1:
+            extra = [[rng.choice(filenames), rng.randint(1, 200), rng.randint(0, 7)] for _ in range(rng.randint(1, 3))]
+            meta["sources"] = json.dumps([[filename, meta["page_number"], meta["chunk_id"]]] + extra, ensure_ascii=False)
+            meta["duplicate_count"] = len(extra)
+        yield f"{filename}_p{meta['page_number']}_c{meta['chunk_id']}_{i}", text, meta
+
+
+def _memory_worker(variant, args, queue) -> None:
+    import gc
+    import tracemalloc
+    import jieba
+    jieba.initialize()
+    if variant == "dicts":
+        from rank_bm25 import BM25Okapi
+    else:
+        from chunk_store import ChunkStore, BM25Index
+    if args.synthetic:
+        corpus = _synthetic_corpus(args.synthetic)
+    else:
+        from vector_store import VectorStore
+        corpus = VectorStore(db_path=args.db_path, collection_name=args.collection)._iter_collection()
+
+    gc.collect()
+    before = _rss_bytes()
+    if args.tracemalloc:
+        tracemalloc.start()
+    if variant == "dicts":
+        cache, tokenized = [], []
+        for doc_id, text, meta in corpus:
+            cache.append({"id": doc_id, "content": text, "metadata": dict(meta)})
+            tokenized.append(list(jieba.cut_for_search(text)))
+        index = BM25Okapi(tokenized)
+        del tokenized
+    else:
+        cache = ChunkStore()
+
+        def tokenized():
+            for doc_id, text, meta in corpus:
+                cache.append(doc_id, text, meta)
+                yield list(jieba.cut_for_search(text))
+
+        index = BM25Index().build(tokenized())
+        cache.freeze()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory() if args.tracemalloc else (None, None)
+    tracemalloc.stop()
+    queue.put((len(cache), _rss_bytes() - before, retained, peak))
+    del index
+
+
+def bench_memory(args) -> None:
+    """对比 dict 缓存 + BM25Okapi 与列式 ChunkStore + BM25Index 的内存占用
+
+    每种实现在独立子进程中从同一语料构建。RSS 增量包含分配器未归还系统的内存，
+    tracemalloc 的 retained 为构建完成后仍被引用的 Python / NumPy 内存。tracemalloc 本身会使构建
+    变慢数倍并占用大量内存，10^5 级语料请加 --no-tracemalloc，只看 RSS。
+    """
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    for variant in ("dicts", "columnar"):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_memory_worker, args=(variant, args, queue))
+        proc.start()
+        count, rss_delta, retained, peak = queue.get()
+        proc.join()
+        line = f"[{variant:>8}] {count} 个文档块, RSS 增量 {rss_delta / 2**20:.1f} MiB"
+        if retained is not None:
+            line += f", retained {retained / 2**20:.1f} MiB, 构建峰值 {peak / 2**20:.1f} MiB"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_pdf = sub.add_parser("pdf", help="对比 PDF 解析后端")
+    p_pdf.add_argument("--fixtures", default=PDF_FIXTURES_DIR, help="PDF 样例目录（默认使用 fixtures/pdf）")
+    p_pdf.set_defaults(func=bench_pdf)
+
+    p_vec = sub.add_parser("vector", help="对比稠密检索后端")
+    p_vec.add_argument("--db-path", default=VECTOR_DB_PATH)
+    p_vec.add_argument("--collection", default=COLLECTION_NAME)
+    p_vec.add_argument("--queries", type=int, default=200)
+    p_vec.add_argument("--top-k", type=int, default=12)
+    p_vec.add_argument("--noise", type=float, default=0.05, help="查询向量的高斯噪声强度")
+    p_vec.set_defaults(func=bench_vector)
+
+    p_mem = sub.add_parser("memory", help="对比语义块缓存与 BM25 索引的内存占用")
+    p_mem.add_argument("--db-path", default=VECTOR_DB_PATH)
+    p_mem.add_argument("--collection", default=COLLECTION_NAME)
+    p_mem.add_argument("--synthetic", type=int, default=0, help="使用 N 个合成语义块代替数据库内容")
+    p_mem.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false", help="不统计 Python 分配，只报告 RSS")
+    p_mem.set_defaults(func=bench_memory)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
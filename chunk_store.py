@@ -0,0 +1,242 @@
+from array import array
+from collections import Counter
+from typing import List, Dict, Iterable, Tuple
+
+import numpy as np
+
+from deduplicator import parse_source_chunks
+
+
+class _StringColumn:
+    """变长字符串列：UTF-8 字节连续存放，另存偏移数组"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offsets = array("q", [0])
+
+    def append(self, value: str) -> None:
+        self._buffer += value.encode("utf-8")
+        self._offsets.append(len(self._buffer))
+
+    def freeze(self) -> None:
+        self._buffer = bytes(self._buffer)
+        self._offsets = np.frombuffer(self._offsets, dtype=np.int64)
+
+    def __getitem__(self, row: int) -> str:
+        return self._buffer[self._offsets[row]:self._offsets[row + 1]].decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def nbytes(self) -> int:
+        return len(self._buffer) + len(self._offsets) * 8
+
+
+class _InternedColumn:
+    """低基数字符串列（文件名、类型等）：去重后的取值表 + int32 编码"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes_by_value: Dict[str, int] = {}
+        self.codes = array("i")
+
+    def append(self, value: str) -> None:
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = self._codes_by_value[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def freeze(self) -> None:
+        self.codes = np.frombuffer(self.codes, dtype=np.int32)
+
+    def __getitem__(self, row: int) -> str:
+        return self.values[self.codes[row]]
+
+    def nbytes(self) -> int:
+        return sum(len(v) for v in self.values) + len(self.codes) * 4
+
+
+class ChunkStore:
+    """[创新点] 列式存储的语义块缓存，替代逐块的 dict
+
+    正文与 id 连续存储，filename / filepath / filetype 按取值编码，page_number / chunk_id 为 NumPy
+    数组。其余元数据（只有合并过重复块的行才有 sources / duplicate_count）按行稀疏存放。检索只在最终 top-k 时才组装成 dict。
+    """
+
+    _INTERNED = ("filename", "filepath", "filetype")
+    _INTEGER = ("page_number", "chunk_id")
+
+    def __init__(self):
+        self._ids = _StringColumn()
+        self._contents = _StringColumn()
+        self._interned = {key: _InternedColumn() for key in self._INTERNED}
+        self._integers = {key: array("i") for key in self._INTEGER}
+        self._extra: Dict[int, Dict] = {}
+        # 去重时被合并进其他块的 (filename, page_number) -> [(行号, 原 chunk_id)]，freeze 时建立
+        self._merged_sources: Dict[tuple, List[tuple]] = {}
+        self._frozen = False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def append(self, doc_id: str, content: str, metadata: Dict) -> None:
+        row = len(self)
+        self._ids.append(doc_id)
+        self._contents.append(content)
+        for key, column in self._interned.items():
+            column.append(str(metadata.get(key, "")))
+        for key, column in self._integers.items():
+            column.append(int(metadata.get(key, 0) or 0))
+        extra = {k: v for k, v in metadata.items() if k not in self._interned and k not in self._integers}
+        if extra:
+            self._extra[row] = extra
+
+    def freeze(self) -> "ChunkStore":
+        """追加完成后压缩为只读数组"""
+        if not self._frozen:
+            self._ids.freeze()
+            self._contents.freeze()
+            for column in self._interned.values():
+                column.freeze()
+            self._integers = {key: np.frombuffer(column, dtype=np.int32) for key, column in self._integers.items()}
+            for row, extra in self._extra.items():
+                if "sources" in extra:
+                    for filename, page_number, chunk_id in parse_source_chunks(extra)[1:]:
+                        self._merged_sources.setdefault((filename, page_number), []).append((row, chunk_id))
+            self._frozen = True
+        return self
+
+    def id(self, row: int) -> str:
+        return self._ids[row]
+
+    def ids(self) -> Iterable[str]:
+        return (self._ids[row] for row in range(len(self)))
+
+    def content(self, row: int) -> str:
+        return self._contents[row]
+
+    def metadata(self, row: int) -> Dict:
+        meta = {key: column[row] for key, column in self._interned.items()}
+        for key, column in self._integers.items():
+            meta[key] = int(column[row])
+        meta.update(self._extra.get(row, {}))
+        return meta
+
+    def get(self, row: int) -> Dict:
+        return {"id": self.id(row), "content": self.content(row), "metadata": self.metadata(row)}
+
+    def page_rows(self, filename: str, page_number: int) -> List[int]:
+        """某一页的全部语义块行号（按该页内的 chunk_id 排序），包括去重时被合并到其他页的块"""
+        positions = {}
+        code = self._interned["filename"]._codes_by_value.get(filename)
+        if code is not None and len(self):
+            mask = (self._interned["filename"].codes == code) & (self._integers["page_number"] == page_number)
+            chunk_ids = self._integers["chunk_id"]
+            positions = {row: int(chunk_ids[row]) for row in np.nonzero(mask)[0].tolist()}
+        # 合并进来的块按它在本页原来的 chunk_id 排序；同一块在本页出现多次时取第一次的位置
+        for row, chunk_id in self._merged_sources.get((filename, page_number), ()):
+            positions[row] = min(positions.get(row, chunk_id), chunk_id)
+        return sorted(positions, key=lambda r: (positions[r], r))
+
+    def nbytes(self) -> int:
+        total = self._ids.nbytes() + self._contents.nbytes()
+        total += sum(column.nbytes() for column in self._interned.values())
+        total += sum(len(column) * 4 for column in self._integers.values())
+        return total
+
+
+class BM25Index:
+    """以整数词项 id 与倒排表 (CSR) 实现的 BM25，打分公式与 rank_bm25.BM25Okapi 一致"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: Dict[str, int] = {}
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.avgdl = 0.0
+        self.idf = np.zeros(0, dtype=np.float32)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def build(self, tokenized_docs: Iterable[List[str]]) -> "BM25Index":
+        term_ids, doc_ids, tfs = array("i"), array("i"), array("i")
+        doc_len = array("i")
+        for doc, tokens in enumerate(tokenized_docs):
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = self.vocab[term] = len(self.vocab)
+                term_ids.append(term_id)
+                doc_ids.append(doc)
+                tfs.append(tf)
+
+        term_ids = np.frombuffer(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self._postings = np.frombuffer(doc_ids, dtype=np.int32)[order].copy()
+        self._tfs = np.frombuffer(tfs, dtype=np.int32)[order].astype(np.float32)
+        df = np.bincount(term_ids, minlength=len(self.vocab))
+        self._indptr = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+
+        self.doc_len = np.frombuffer(doc_len, dtype=np.int32).astype(np.float32)
+        n_docs = len(self.doc_len)
+        self.avgdl = float(self.doc_len.mean()) if n_docs else 0.0
+
+        # 与 BM25Okapi 相同：负 idf 用 epsilon * 平均 idf 代替
+        idf = np.log((n_docs - df + 0.5) / (df + 0.5))
+        average_idf = float(idf.mean()) if len(idf) else 0.0
+        idf[idf < 0] = self.epsilon * average_idf
+        self.idf = idf.astype(np.float32)
+        return self
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        scores = np.zeros(len(self.doc_len), dtype=np.float32)
+        if not len(scores):
+            return scores
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avgdl, 1e-9))
+        for token in query_tokens:
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self._indptr[term_id], self._indptr[term_id + 1]
+            docs, tf = self._postings[start:end], self._tfs[start:end]
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm[docs])
+        return scores
+
+    def top_n_scored(self, query_tokens: List[str], n: int) -> List[Tuple[int, float]]:
+        """得分大于 0 的前 n 个 (文档行号, 得分)，按得分降序"""
+        scores = self.get_scores(query_tokens)
+        n = min(n, len(scores))
+        if n <= 0:
+            return []
+        candidates = np.argpartition(-scores, n - 1)[:n]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row), float(scores[row])) for row in candidates if scores[row] > 0]
+
+    def top_n(self, query_tokens: List[str], n: int) -> List[int]:
+        """得分大于 0 的前 n 个文档行号，按得分降序"""
+        return [row for row, _ in self.top_n_scored(query_tokens, n)]
+
+    def max_score(self, query_tokens: List[str]) -> float:
+        """查询在本索引中的得分上界：每个词项都取 tf -> ∞ 时的 idf * (k1 + 1)
+
+        语料中没有的词按 df = 0 计 idf，缺少查询词的语料上界更高，归一化后的分数也就更低。
+        用于把不同语料（分片）的 BM25 分数放到同一尺度上比较。
+        """
+        n_docs = len(self.doc_len)
+        unseen_idf = float(np.log((n_docs + 0.5) / 0.5)) if n_docs else 0.0
+        total = 0.0
+        for token in query_tokens:
+            term_id = self.vocab.get(token)
+            total += float(self.idf[term_id]) if term_id is not None else unseen_idf
+        return total * (self.k1 + 1)
+
+    def nbytes(self) -> int:
+        arrays = (self.doc_len, self.idf, self._indptr, self._postings, self._tfs)
+        return sum(a.nbytes for a in arrays) + sum(len(t) * 2 + 8 for t in self.vocab)
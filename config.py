@@ -4,6 +4,17 @@ OPENAI_API_BASE = "your_api_base"
 MODEL_NAME = "qwen2.5-72b-instruct"
 OPENAI_EMBEDDING_MODEL = "text-embedding-v4"
 
+# HTTP客户端配置（共享连接池、超时、限流与重试）
+HTTP_TIMEOUT = 60
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_MAX_CONNECTIONS = 20
+EMBEDDING_RATE_LIMIT = 10  # 每秒请求数，<= 0 表示不限流
+CHAT_RATE_LIMIT = 2
+MAX_RETRIES = 6
+BACKOFF_BASE = 0.5  # 秒
+BACKOFF_MAX = 30
+RETRY_AFTER_MAX = 300  # 服务端要求等待超过该秒数时不再重试，直接报错
+
 # 数据目录配置
 DATA_DIR = "./data"
 
@@ -11,11 +22,42 @@ DATA_DIR = "./data"
 VECTOR_DB_PATH = "./vector_db"
 COLLECTION_NAME = "collection"
 
+# 多课程分片：DATA_DIR 下每个子目录为一门课程，各自使用独立的 collection 与 BM25 索引；
+# DATA_DIR 根目录下的文件归入 DEFAULT_COURSE。设为 False 则所有文件共用 COLLECTION_NAME
+SHARD_BY_COURSE = True
+DEFAULT_COURSE = "default"
+SHARD_MANIFEST = "shards.json"
+
+# 稠密检索后端: "chroma" 或 "flat"（进程内 mmap 扁平索引）
+DENSE_BACKEND = "chroma"
+# 扁平索引量化类型: "float16" 或 "int8"
+FLAT_INDEX_DTYPE = "float16"
+# int8 模式下取 top_k 的多少倍候选，用 ChromaDB 中的原始向量重新打分；1 表示不重打分
+FLAT_INDEX_RESCORE = 4
+
+# 文档解析缓存配置
+EXTRACT_CACHE_DIR = "./cache/extract"
+LOADER_VERSION = "2"
+
+# PDF解析后端: "pymupdf"（快速，空白/乱码页自动回退到 pdfplumber）或 "pdfplumber"
+PDF_BACKEND = "pymupdf"
+
 # 文本处理配置
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 100
 MAX_TOKENS = 100000
 
+# 近重复去重配置 (MinHash + LSH)，DEDUP_THRESHOLD 设为 None 则不去重
+DEDUP_THRESHOLD = 0.8
+DEDUP_NUM_PERM = 128
+DEDUP_BANDS = 16
+DEDUP_SHINGLE_SIZE = 5
+
 # RAG配置
 TOP_K = 6
-MAX_ITER = 10
\ No newline at end of file
+MAX_ITER = 10
+
+# 页面缓存与预取配置（每个会话）
+PAGE_CACHE_MAX_PAGES = 256
+PAGE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+PREFETCH_ADJACENT = 1  # 额外预取前后各几页
\ No newline at end of file
@@ -0,0 +1,140 @@
+import json
+import zlib
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_SHINGLE_SIZE
+
+# 大于 2^32 的最小素数；a、b、x 均小于 2^32，(a * x + b) 不会溢出 uint64
+_HASH_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+class ChunkDeduplicator:
+    """[创新点] 基于 MinHash + LSH 的近重复语义块去重
+
+    课件中的标题页、目录页、页脚在多个文件里反复出现，PDF 导出版又与 PPTX 内容重复。
+    近重复块只保留第一次出现的规范块，其余来源 (filename, page_number, chunk_id) 合并进规范块的
+    sources 元数据中，引用时仍可列出全部出处，拼接整页时也能按 chunk_id 放回原位。
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        bands: int = DEDUP_BANDS,
+        shingle_size: int = DEDUP_SHINGLE_SIZE,
+        seed: int = 1,
+    ):
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) 必须能被 bands ({bands}) 整除")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2**32 - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2**32 - 1, size=num_perm, dtype=np.uint64)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """字符级 n-gram（忽略空白），中文文本无需分词即可比较"""
+        text = "".join(text.split()).lower()
+        k = self.shingle_size
+        if len(text) <= k:
+            grams = {text}
+        else:
+            grams = {text[i:i + k] for i in range(len(text) - k + 1)}
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self._shingles(text)
+        # (num_perm, n_shingles) 的置换哈希，按行取最小值
+        hashed = (np.outer(self._a, shingles) + self._b[:, None]) % _HASH_PRIME
+        return (hashed & _MAX_HASH).min(axis=1)
+
+    def deduplicate(self, chunks: List[Dict]) -> Tuple[List[Dict], int]:
+        """返回 (去重后的语义块, 被合并的近重复块数量)"""
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        signatures: List[np.ndarray] = []
+        canonical: List[Dict] = []
+        canonical_sources: List[List] = []  # 与 canonical 按下标对应
+        duplicate_counts: List[int] = []
+        removed = 0
+
+        for chunk in chunks:
+            content = chunk.get("content", "")
+            source = [chunk.get("filename", "unknown"), chunk.get("page_number", 0), chunk.get("chunk_id", 0)]
+            if not content.strip():
+                continue
+            signature = self.signature(content)
+            band_keys = [(b, signature[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+
+            # LSH 候选，再用签名估计的 Jaccard 相似度确认
+            match = None
+            seen = set()
+            for key in band_keys:
+                for idx in buckets.get(key, ()):
+                    if idx in seen:
+                        continue
+                    seen.add(idx)
+                    if np.mean(signatures[idx] == signature) >= self.threshold:
+                        match = idx
+                        break
+                if match is not None:
+                    break
+
+            if match is not None:
+                if source not in canonical_sources[match]:
+                    canonical_sources[match].append(source)
+                duplicate_counts[match] += 1
+                removed += 1
+                continue
+
+            idx = len(canonical)
+            canonical.append(dict(chunk))
+            canonical_sources.append([source])
+            duplicate_counts.append(0)
+            signatures.append(signature)
+            for key in band_keys:
+                buckets.setdefault(key, []).append(idx)
+
+        # 只为确实合并过重复块的规范块写入额外元数据；没有 sources 时 parse_sources 回退到 filename/page_number。
+        # ChromaDB 元数据只支持标量，来源列表序列化为 JSON 字符串
+        for chunk, sources, duplicates in zip(canonical, canonical_sources, duplicate_counts):
+            if len(sources) > 1:
+                chunk["sources"] = json.dumps(sources, ensure_ascii=False)
+            if duplicates:
+                chunk["duplicate_count"] = duplicates
+
+        return canonical, removed
+
+    def deduplicate_chunks(self, chunks: List[Dict]) -> List[Dict]:
+        """去重并打印节省的 Embedding 调用数"""
+        deduped, removed = self.deduplicate(chunks)
+        total = len(chunks)
+        ratio = removed / total * 100 if total else 0.0
+        print(f"近重复去重完成：{total} -> {len(deduped)} 个语义块，节省 {removed} 次Embedding ({ratio:.1f}%)")
+        return deduped
+
+
+def parse_source_chunks(metadata: Dict) -> List[Tuple[str, int, int]]:
+    """从元数据中取出全部 (filename, page_number, chunk_id) 来源，第一个是规范块自身"""
+    raw = metadata.get("sources")
+    if raw:
+        try:
+            return [(filename, page, chunk_id) for filename, page, chunk_id in json.loads(raw)]
+        except (ValueError, TypeError):
+            pass
+    return [(metadata.get("filename", "unknown"), metadata.get("page_number", 0), metadata.get("chunk_id", 0))]
+
+
+def parse_sources(metadata: Dict) -> List[Tuple[str, int]]:
+    """从检索结果元数据中取出全部 (filename, page_number) 来源（按页去重），用于引用"""
+    pages = []
+    for filename, page, _ in parse_source_chunks(metadata):
+        if (filename, page) not in pages:
+            pages.append((filename, page))
+    return pages
@@ -1,18 +1,95 @@
 import os
+import gzip
+import zlib
+import json
+import hashlib
 import logging
-from typing import List, Dict
+import unicodedata
+from typing import List, Dict, Optional
 import pdfplumber
 import docx2txt
 from pptx import Presentation
 from pptx.enum.shapes import MSO_SHAPE_TYPE
-from config import DATA_DIR
+from config import DATA_DIR, EXTRACT_CACHE_DIR, LOADER_VERSION, PDF_BACKEND
+
+try:
+    import pymupdf as fitz  # PyMuPDF >= 1.24
+except ImportError:
+    try:
+        import fitz  # 旧版 PyMuPDF
+    except ImportError:
+        fitz = None
 
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
+
+def is_garbled_text(text: str, threshold: float = 0.3) -> bool:
+    """判断提取出的文本是否为空或乱码（替换字符、私用区字符、(cid:x) 占位符比例过高）"""
+    stripped = "".join(text.split())
+    if not stripped:
+        return True
+    bad = stripped.count("\ufffd") + stripped.count("(cid:") * 6
+    bad += sum(1 for ch in stripped if unicodedata.category(ch) in ("Co", "Cc", "Cn"))
+    return bad / len(stripped) > threshold
+
 class DocumentLoader:
-    def __init__(self, data_dir: str = DATA_DIR):
+    def __init__(self, data_dir: str = DATA_DIR, cache_dir: Optional[str] = EXTRACT_CACHE_DIR, pdf_backend: str = PDF_BACKEND):
         self.data_dir = data_dir
         self.supported_formats = [".pdf", ".pptx", ".docx", ".txt"]
+        # 解析结果缓存目录，设为 None 则禁用缓存
+        self.cache_dir = cache_dir
+        if pdf_backend not in ("pymupdf", "pdfplumber"):
+            raise ValueError(f"不支持的PDF解析后端: {pdf_backend}")
+        if pdf_backend == "pymupdf" and fitz is None:
+            print("警告：未安装 PyMuPDF，PDF解析回退到 pdfplumber")
+            pdf_backend = "pdfplumber"
+        self.pdf_backend = pdf_backend
+        # 最近一次 load_pdf 中回退到 pdfplumber 的页数，供基准测试统计
+        self.pdf_fallback_pages = 0
+
+    def _file_digest(self, file_path: str) -> str:
+        """计算文件内容的 SHA-256，作为解析缓存的键"""
+        h = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def _cache_path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}{ext}.jsonl.gz")
+
+    def _cache_header(self, ext: str) -> Dict:
+        """缓存版本头：PDF 的解析结果还取决于所用后端"""
+        header = {"loader_version": LOADER_VERSION}
+        if ext == ".pdf":
+            header["pdf_backend"] = self.pdf_backend
+        return header
+
+    def _read_cache(self, cache_path: str, ext: str) -> Optional[List[Dict]]:
+        """读取解析缓存：首行为版本头，其余每行一个页面记录。版本不符或文件损坏时返回 None"""
+        try:
+            with gzip.open(cache_path, "rt", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                if header != self._cache_header(ext):
+                    return None
+                return [json.loads(line) for line in f if line.strip()]
+        except (OSError, EOFError, ValueError, zlib.error):
+            return None
+
+    def _write_cache(self, cache_path: str, ext: str, records: List[Dict]) -> None:
+        """原子写入解析缓存，写入失败不影响正常加载"""
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                f.write(json.dumps(self._cache_header(ext)) + "\n")
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"写入解析缓存失败 {cache_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     def _extract_shape_text_recursive(self, shape) -> str:
         """递归提取 PPT 形状中的文本，支持组合图"""
@@ -75,6 +152,12 @@ class DocumentLoader:
 
     def load_pdf(self, file_path: str) -> List[Dict]:
         """加载PDF文件 (仅提取可选文本)"""
+        self.pdf_fallback_pages = 0
+        if self.pdf_backend == "pymupdf":
+            return self._load_pdf_pymupdf(file_path)
+        return self._load_pdf_pdfplumber(file_path)
+
+    def _load_pdf_pdfplumber(self, file_path: str) -> List[Dict]:
         results = []
         try:
             with pdfplumber.open(file_path) as pdf:
@@ -86,6 +169,33 @@ class DocumentLoader:
             print(f"读取PDF文件出错 {file_path}: {e}")
         return results
 
+    def _load_pdf_pymupdf(self, file_path: str) -> List[Dict]:
+        """用 PyMuPDF 快速提取；仅对空白或乱码页逐页回退到 pdfplumber 的版面分析"""
+        results = []
+        plumber_pdf = None
+        try:
+            with fitz.open(file_path) as pdf:
+                for i, page in enumerate(pdf):
+                    text = page.get_text("text", sort=True).strip()
+                    if is_garbled_text(text):
+                        try:
+                            if plumber_pdf is None:
+                                plumber_pdf = pdfplumber.open(file_path)
+                            fallback = plumber_pdf.pages[i].extract_text() or ""
+                            if not is_garbled_text(fallback) or not text:
+                                text = fallback
+                            self.pdf_fallback_pages += 1
+                        except Exception as e:
+                            print(f"pdfplumber 回退解析出错 {file_path} 第 {i + 1} 页: {e}")
+                    formatted_text = f"--- 第 {i + 1} 页 ---\n{text}\n"
+                    results.append({"text": formatted_text})
+        except Exception as e:
+            print(f"读取PDF文件出错 {file_path}: {e}")
+        finally:
+            if plumber_pdf is not None:
+                plumber_pdf.close()
+        return results
+
     def load_docx(self, file_path: str) -> str:
         try:
             return docx2txt.process(file_path)
@@ -101,8 +211,28 @@ class DocumentLoader:
             except Exception: return ""
 
     def load_document(self, file_path: str) -> List[Dict[str, str]]:
+        """加载单个文档。解析结果只取决于文件内容，因此按内容哈希缓存页面记录，重复运行时跳过解析"""
         ext = os.path.splitext(file_path)[1].lower()
         filename = os.path.basename(file_path)
+
+        cache_path = None
+        if self.cache_dir:
+            try:
+                cache_path = self._cache_path(self._file_digest(file_path), ext)
+            except OSError as e:
+                print(f"计算文件哈希出错 {file_path}: {e}")
+            if cache_path:
+                records = self._read_cache(cache_path, ext)
+                if records is not None:
+                    return [{"content": r["content"], "filename": filename, "filepath": file_path, "filetype": ext, "page_number": r["page_number"]} for r in records]
+
+        documents = self._parse_document(file_path, ext, filename)
+        # 解析出错时各 load_* 返回空结果，不写入缓存以便下次重试
+        if cache_path and documents:
+            self._write_cache(cache_path, ext, [{"content": d["content"], "page_number": d["page_number"]} for d in documents])
+        return documents
+
+    def _parse_document(self, file_path: str, ext: str, filename: str) -> List[Dict[str, str]]:
         documents = []
 
         if ext == ".pdf":
@@ -121,12 +251,15 @@ class DocumentLoader:
             if content: documents.append({"content": content, "filename": filename, "filepath": file_path, "filetype": ext, "page_number": 0})
         return documents
 
-    def load_all_documents(self) -> List[Dict[str, str]]:
+    def load_all_documents(self, recursive: bool = True) -> List[Dict[str, str]]:
+        """加载数据目录下的所有文档；recursive=False 时只加载目录本身的文件（不含课程子目录）"""
         if not os.path.exists(self.data_dir):
             print(f"数据目录不存在: {self.data_dir}")
             return None
         documents = []
         for root, dirs, files in os.walk(self.data_dir):
+            if not recursive:
+                dirs.clear()
             for file in files:
                 if file.startswith("~$") or file.startswith("."): continue # 忽略临时文件
                 ext = os.path.splitext(file)[1].lower()
@@ -0,0 +1,68 @@
+"""生成 benchmark.py pdf 使用的 PDF 样例（需要 PyMuPDF）
+
+    python fixtures/make_pdf_fixtures.py
+
+生成的文件已提交在 fixtures/pdf/ 下，只有修改样例内容时才需要重新运行。
+"""
+import os
+
+import pymupdf
+
+OUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf")
+SLIDE = pymupdf.Rect(0, 0, 960, 540)  # 16:9 幻灯片导出尺寸
+
+EN_TOPICS = [
+    ("Introduction to NLP", ["What is natural language processing", "Tokens, types and vocabularies", "Course logistics and grading"]),
+    ("Language Models", ["n-gram models and smoothing", "Perplexity as an evaluation metric", "Sparsity and back-off"]),
+    ("Word Embeddings", ["Distributional hypothesis", "word2vec: skip-gram and CBOW", "GloVe and co-occurrence statistics"]),
+    ("Neural Networks", ["Feed-forward layers and activations", "Backpropagation and gradient descent", "Regularization: dropout, weight decay"]),
+    ("Sequence Models", ["Recurrent neural networks", "Vanishing gradients and LSTM/GRU", "Sequence-to-sequence with attention"]),
+    ("Transformers", ["Scaled dot-product attention", "Multi-head attention and positional encoding", "Encoder, decoder and pre-training"]),
+]
+
+ZH_TOPICS = [
+    ("课程介绍", ["什么是自然语言处理", "词元、词型与词表", "课程安排与评分方式"]),
+    ("语言模型", ["n 元语法模型与平滑", "困惑度作为评价指标", "数据稀疏与回退"]),
+    ("词向量", ["分布式假设", "word2vec：跳字模型与连续词袋模型", "GloVe 与共现统计"]),
+    ("神经网络", ["前馈层与激活函数", "反向传播与梯度下降", "正则化：Dropout 与权重衰减"]),
+    ("序列模型", ["循环神经网络", "梯度消失与 LSTM/GRU", "带注意力机制的序列到序列模型"]),
+    ("Transformer", ["缩放点积注意力", "多头注意力与位置编码", "编码器、解码器与预训练"]),
+]
+
+
+def add_slide(doc, title, bullets, fontname, footer):
+    page = doc.new_page(width=SLIDE.width, height=SLIDE.height)
+    page.insert_text((60, 90), title, fontsize=36, fontname=fontname)
+    for i, bullet in enumerate(bullets):
+        page.insert_text((80, 170 + i * 60), f"- {bullet}", fontsize=24, fontname=fontname)
+    page.insert_text((60, 510), footer, fontsize=12, fontname=fontname)
+
+
+def make_slides(path, topics, fontname, footer):
+    doc = pymupdf.open()
+    for title, bullets in topics:
+        add_slide(doc, title, bullets, fontname, footer)
+    doc.save(path, garbage=4, deflate=True)
+
+
+def make_with_blank_pages(path):
+    """含空白页与纯图形页，用于检验空页回退到 pdfplumber 时页码标记不变"""
+    doc = pymupdf.open()
+    add_slide(doc, "Midterm Review", ["Topics covered in weeks 1-6", "Sample questions"], "helv", "CS4314 NLP")
+    doc.new_page(width=SLIDE.width, height=SLIDE.height)
+    page = doc.new_page(width=SLIDE.width, height=SLIDE.height)
+    page.draw_rect(pymupdf.Rect(100, 100, 860, 440), color=(0, 0, 1), fill=(0.8, 0.9, 1))
+    add_slide(doc, "Questions?", ["Office hours: Tue 14:00-16:00"], "helv", "CS4314 NLP")
+    doc.save(path, garbage=4, deflate=True)
+
+
+def main():
+    os.makedirs(OUT_DIR, exist_ok=True)
+    make_slides(os.path.join(OUT_DIR, "slides_en.pdf"), EN_TOPICS, "helv", "CS4314 Natural Language Processing")
+    make_slides(os.path.join(OUT_DIR, "slides_zh.pdf"), ZH_TOPICS, "china-s", "CS4314 自然语言处理")
+    make_with_blank_pages(os.path.join(OUT_DIR, "review_with_blank_pages.pdf"))
+    print(f"PDF 样例已生成: {OUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
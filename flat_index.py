@@ -0,0 +1,130 @@
+import os
+import json
+from typing import List, Tuple, Optional, Callable
+
+import numpy as np
+
+
+class FlatIndex:
+    """[创新点] 内存映射的扁平向量索引
+
+    归一化后的向量以 float16 或 int8（每个向量一个缩放系数）存入 .npy 文件，查询时以 mmap
+    方式打开，分块做矩阵向量乘法得到余弦相似度。int8 模式可先取 rescore_factor 倍候选，
+    再用原始精度向量重新打分。
+    """
+
+    BLOCK_ROWS = 16384
+
+    def __init__(self, index_dir: str, dtype: str = "float16"):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"不支持的向量量化类型: {dtype}")
+        self.index_dir = index_dir
+        self.dtype = dtype
+        self.ids: List[str] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.index_dir, f"vectors_{self.dtype}.npy")
+
+    @property
+    def _scales_path(self) -> str:
+        return os.path.join(self.index_dir, "scales.npy")
+
+    @property
+    def _ids_path(self) -> str:
+        return os.path.join(self.index_dir, f"ids_{self.dtype}.json")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def load(self) -> bool:
+        """以 mmap 方式打开已有索引，不存在或损坏时返回 False"""
+        try:
+            with open(self._ids_path, "r", encoding="utf-8") as f:
+                ids = json.load(f)
+            vectors = np.load(self._vectors_path, mmap_mode="r")
+            scales = np.load(self._scales_path, mmap_mode="r") if self.dtype == "int8" else None
+        except (OSError, ValueError):
+            return False
+        if vectors.shape[0] != len(ids) or (scales is not None and scales.shape[0] != len(ids)):
+            return False
+        self.ids, self.vectors, self.scales = ids, vectors, scales
+        return True
+
+    def build(self, ids: List[str], embeddings) -> None:
+        """量化并写入索引文件，随后重新以 mmap 方式打开"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+
+        vectors_tmp = self._vectors_path + ".tmp.npy"
+        if self.dtype == "float16":
+            np.save(vectors_tmp, matrix.astype(np.float16))
+        else:
+            # 对称量化：每行按最大绝对值缩放到 [-127, 127]
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales = np.maximum(scales, 1e-12).astype(np.float32)
+            np.save(vectors_tmp, np.round(matrix / scales[:, None]).astype(np.int8))
+            scales_tmp = self._scales_path + ".tmp.npy"
+            np.save(scales_tmp, scales)
+            os.replace(scales_tmp, self._scales_path)
+        os.replace(vectors_tmp, self._vectors_path)
+        ids_tmp = self._ids_path + ".tmp"
+        with open(ids_tmp, "w", encoding="utf-8") as f:
+            json.dump(list(ids), f, ensure_ascii=False)
+        os.replace(ids_tmp, self._ids_path)
+        self.load()
+
+    def clear(self) -> None:
+        self.ids, self.vectors, self.scales = [], None, None
+        for path in (self._vectors_path, self._scales_path, self._ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """计算查询向量与全部向量的余弦相似度（分块，避免一次性把整个矩阵转成 float32）"""
+        out = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), self.BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + self.BLOCK_ROWS], dtype=np.float32)
+            out[start:start + len(block)] = block @ query
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        rescore_factor: int = 1,
+        fetch_embeddings: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    ) -> List[Tuple[int, float]]:
+        """返回按相似度降序的 (行号, 分数)。提供 fetch_embeddings 且 rescore_factor > 1 时，
+        用原始精度向量对候选重新打分"""
+        if self.vectors is None or not self.ids:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        scores = self.scores(query)
+        n_candidates = min(len(scores), top_k * max(rescore_factor, 1))
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+
+        if fetch_embeddings is not None and n_candidates > top_k:
+            exact = np.asarray(fetch_embeddings([self.ids[i] for i in candidates]), dtype=np.float32)
+            exact /= np.maximum(np.linalg.norm(exact, axis=1, keepdims=True), 1e-12)
+            candidate_scores = exact @ query
+        else:
+            candidate_scores = scores[candidates]
+
+        order = np.argsort(-candidate_scores)[:top_k]
+        return [(int(candidates[i]), float(candidate_scores[i])) for i in order]
+
+    def memory_bytes(self) -> int:
+        """索引文件大小（mmap 后常驻内存的上限）"""
+        total = self.vectors.nbytes if self.vectors is not None else 0
+        if self.scales is not None:
+            total += self.scales.nbytes
+        return total
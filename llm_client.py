@@ -0,0 +1,194 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_API_BASE,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    EMBEDDING_RATE_LIMIT,
+    CHAT_RATE_LIMIT,
+    MAX_RETRIES,
+    BACKOFF_BASE,
+    BACKOFF_MAX,
+    RETRY_AFTER_MAX,
+)
+
+
+class TokenBucket:
+    """令牌桶限流器：以 rate 个/秒的速度补充令牌，最多积攒 capacity 个"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """阻塞直到取得令牌，返回等待的秒数。rate <= 0 表示不限流"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class SharedClient:
+    """共享的 OpenAI 客户端层
+
+    - 所有组件复用同一个 httpx 连接池（keep-alive），并设置显式超时
+    - Embedding 与 Chat 接口各自使用独立的令牌桶限流
+    - 429 / 超时 / 5xx 按带抖动的指数退避重试，至少等待服务端给出的 Retry-After；超过 retry_after_max 时直接报错
+    - 统计请求、限流、重试与失败次数
+    """
+
+    def __init__(
+        self,
+        api_key: str = OPENAI_API_KEY,
+        api_base: str = OPENAI_API_BASE,
+        embedding_rate: float = EMBEDDING_RATE_LIMIT,
+        chat_rate: float = CHAT_RATE_LIMIT,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+        retry_after_max: float = RETRY_AFTER_MAX,
+    ):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.limiters = {
+            "embeddings": TokenBucket(embedding_rate),
+            "chat": TokenBucket(chat_rate),
+        }
+        self._client = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, float]] = {
+            endpoint: {"requests": 0, "throttled": 0, "retries": 0, "failures": 0, "rate_limit_wait": 0.0}
+            for endpoint in self.limiters
+        }
+
+    @property
+    def client(self):
+        # openai/httpx 导入较慢，首次请求时再创建
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+                    http_client = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                        ),
+                        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                    )
+                    # 重试由本层统一处理，关闭 SDK 自带的重试
+                    self._client = OpenAI(
+                        api_key=self.api_key, base_url=self.api_base, http_client=http_client, max_retries=0
+                    )
+        return self._client
+
+    def _count(self, endpoint: str, key: str, value: float = 1) -> None:
+        with self._stats_lock:
+            self.stats[endpoint][key] += value
+
+    @staticmethod
+    def _retry_after(error) -> Optional[float]:
+        """从响应头解析 Retry-After（秒数或 HTTP 日期），以及 retry-after-ms"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        value = headers.get("retry-after-ms")
+        if value:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter；服务端给出 Retry-After 时至少等待该时长（backoff_max 只限制指数退避部分）
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _call(self, endpoint: str, func, **kwargs):
+        import openai
+
+        retryable = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+        for attempt in range(self.max_retries + 1):
+            self._count(endpoint, "rate_limit_wait", self.limiters[endpoint].acquire())
+            self._count(endpoint, "requests")
+            try:
+                return func(**kwargs)
+            except retryable as e:
+                if isinstance(e, openai.RateLimitError):
+                    self._count(endpoint, "throttled")
+                retry_after = self._retry_after(e)
+                # 已无重试次数，或服务端要求的等待时间过长时放弃
+                if attempt == self.max_retries or (retry_after is not None and retry_after > self.retry_after_max):
+                    self._count(endpoint, "failures")
+                    raise
+                self._count(endpoint, "retries")
+                time.sleep(self._backoff(attempt, retry_after))
+            except Exception:
+                self._count(endpoint, "failures")
+                raise
+
+    def create_embedding(self, **kwargs):
+        return self._call("embeddings", self.client.embeddings.create, **kwargs)
+
+    def create_chat_completion(self, **kwargs):
+        return self._call("chat", self.client.chat.completions.create, **kwargs)
+
+    def format_stats(self) -> str:
+        with self._stats_lock:
+            return "; ".join(
+                f"{endpoint}: 请求 {int(s['requests'])}, 限流(429) {int(s['throttled'])}, "
+                f"重试 {int(s['retries'])}, 失败 {int(s['failures'])}, 限速等待 {s['rate_limit_wait']:.1f}s"
+                for endpoint, s in self.stats.items()
+            )
+
+
+_shared_client: Optional[SharedClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_client() -> SharedClient:
+    """进程内唯一的共享客户端"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                _shared_client = SharedClient()
+    return _shared_client
@@ -1,24 +1,93 @@
 import os
-from rag_agent import RAGAgent
+import sys
+import time
+import argparse
+import importlib
+from contextlib import contextmanager
 
-from config import VECTOR_DB_PATH, MODEL_NAME
+from config import VECTOR_DB_PATH, MODEL_NAME, SHARD_BY_COURSE
 
 
-def main():
+def profile_startup(course=None) -> None:
+    """按阶段统计启动耗时：依赖导入、Agent 初始化、数据库打开、分词词典与索引构建"""
+    timings = []
+
+    @contextmanager
+    def timed(label):
+        start = time.perf_counter()
+        yield
+        timings.append((label, time.perf_counter() - start))
+
+    # 先单独导入重量级依赖，后续阶段只剩初始化本身的耗时
+    for module in ("colorama", "numpy", "openai", "chromadb", "jieba"):
+        with timed(f"import {module}"):
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+    with timed("import rag_agent"):
+        from rag_agent import RAGAgent
+    with timed("RAGAgent()"):
+        agent = RAGAgent(model=MODEL_NAME, course=course)
+    # 只有分片存储接受课程参数（--course 仅在 SHARD_BY_COURSE 时可用）
+    course_args = (course,) if course is not None else ()
+    with timed("OpenAI client"):
+        agent.client.client
+    with timed("open ChromaDB"):
+        count = agent.vector_store.get_collection_count(*course_args)
+    with timed("jieba dictionary"):
+        agent.vector_store.load_tokenizer()
+    with timed(f"build BM25 index ({count} chunks)"):
+        agent.vector_store.ensure_index(*course_args, verbose=False)
+
+    total = sum(seconds for _, seconds in timings)
+    print("启动耗时分析:")
+    for label, seconds in timings:
+        print(f"  {label:<36} {seconds * 1000:9.1f} ms  {seconds / total * 100:5.1f}%")
+    print(f"  {'total':<36} {total * 1000:9.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="智能课程助教")
+    parser.add_argument("--profile-startup", action="store_true", help="输出各阶段启动耗时后退出")
+    parser.add_argument("--course", default=None, help="只检索指定课程（DATA_DIR 下的子目录名），默认检索所有课程")
+    args = parser.parse_args(argv)
 
     if not os.path.exists(VECTOR_DB_PATH):
         return
 
-    # 初始化RAG Agent
-    agent = RAGAgent(model=MODEL_NAME)
+    if args.course is not None:
+        if not SHARD_BY_COURSE:
+            print("未启用按课程分片 (config.SHARD_BY_COURSE)，不能使用 --course")
+            return
+        from sharded_store import ShardedVectorStore
+        courses = ShardedVectorStore(db_path=VECTOR_DB_PATH).courses
+        if args.course not in courses:
+            print(f"未知课程: {args.course}，已建立索引的课程: {', '.join(courses) or '无'}")
+            return
 
-    # 检查知识库
-    count = agent.vector_store.get_collection_count()
+    if args.profile_startup:
+        profile_startup(args.course)
+        return
+
+    from rag_agent import RAGAgent
+
+    # 初始化RAG Agent（数据库与索引均延迟加载）
+    agent = RAGAgent(model=MODEL_NAME, course=args.course)
+    # 只有分片存储接受课程参数；指定课程时只检查、只预热该课程的分片
+    course_args = (args.course,) if args.course is not None else ()
+
+    # 检查知识库（只打开数据库读取条数，不构建索引）
+    count = agent.vector_store.get_collection_count(*course_args)
     if count == 0:
+        print("知识库为空，请先运行 process_data.py")
         return
 
+    # 用户输入第一个问题时，在后台加载词典并构建检索索引
+    agent.vector_store.warm_up(*course_args)
+
     agent.chat()
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
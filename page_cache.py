@@ -0,0 +1,149 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from config import PAGE_CACHE_MAX_PAGES, PAGE_CACHE_MAX_BYTES, PREFETCH_ADJACENT
+
+# (课程, 文件名, 页码)；不同课程可能有同名文件，课程未知（未分片）时为 None
+PageKey = Tuple[Optional[str], str, int]
+
+
+class PageCache:
+    """按页数与字节数双重限制的 LRU 页面缓存（每个会话一个）
+
+    记录命中 / 未命中次数，以及由预取写入、随后被 lookup 命中的页数，用于评估预取效果。
+    """
+
+    def __init__(self, max_pages: int = PAGE_CACHE_MAX_PAGES, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self._pages: "OrderedDict[PageKey, str]" = OrderedDict()
+        self._prefetched = set()  # 由预取写入、尚未被 lookup 命中过的页
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "prefetched": 0, "prefetch_hits": 0, "evictions": 0}
+
+    @staticmethod
+    def _size(text: str) -> int:
+        return len(text.encode("utf-8"))
+
+    def __contains__(self, key: PageKey) -> bool:
+        with self._lock:
+            return key in self._pages
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: PageKey) -> Optional[str]:
+        with self._lock:
+            text = self._pages.get(key)
+            if text is None:
+                self.stats["misses"] += 1
+                return None
+            self._pages.move_to_end(key)
+            self.stats["hits"] += 1
+            if key in self._prefetched:
+                self._prefetched.discard(key)
+                self.stats["prefetch_hits"] += 1
+            return text
+
+    def put(self, key: PageKey, text: str, prefetched: bool = False) -> None:
+        size = self._size(text)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            self._pages[key] = text
+            self._bytes += size
+            if prefetched:
+                self._prefetched.add(key)
+                self.stats["prefetched"] += 1
+            while len(self._pages) > self.max_pages or self._bytes > self.max_bytes:
+                evicted_key, evicted = self._pages.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self._prefetched.discard(evicted_key)
+                self.stats["evictions"] += 1
+
+    def format_stats(self) -> str:
+        with self._lock:
+            s = dict(self.stats)
+            lookups = s["hits"] + s["misses"]
+            hit_rate = s["hits"] / lookups * 100 if lookups else 0.0
+            prefetch_rate = s["prefetch_hits"] / s["prefetched"] * 100 if s["prefetched"] else 0.0
+            return (f"页面缓存: {len(self._pages)} 页 / {self._bytes / 1024:.1f} KiB, "
+                    f"命中率 {hit_rate:.1f}% ({s['hits']}/{lookups}), "
+                    f"预取 {s['prefetched']} 页, 预取命中 {s['prefetch_hits']} ({prefetch_rate:.1f}%), "
+                    f"淘汰 {s['evictions']} 页")
+
+
+class PagePrefetcher:
+    """[创新点] 检索结果返回后，在后台线程预取相关页面（及相邻页）的完整文本
+
+    lookup 时若该页正在预取，等待预取完成而不是重复读取。
+    """
+
+    def __init__(
+        self,
+        cache: PageCache,
+        fetch_page: Callable[[str, int, Optional[str]], Optional[str]],
+        adjacent: int = PREFETCH_ADJACENT,
+    ):
+        self.cache = cache
+        self.fetch_page = fetch_page
+        self.adjacent = adjacent
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-prefetch")
+        self._pending: Dict[PageKey, Future] = {}
+        self._lock = threading.Lock()
+
+    def _expand(self, keys: Iterable[PageKey]) -> Iterable[PageKey]:
+        keys = list(keys)
+        seen = set()
+        # 先预取全部命中页，再由近及远预取各命中页的相邻页
+        for offset in [0] + [d for k in range(1, self.adjacent + 1) for d in (-k, k)]:
+            for course, filename, page_number in keys:
+                page = page_number + offset
+                key = (course, filename, page)
+                if page >= 0 and key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def _load(self, key: PageKey) -> Optional[str]:
+        try:
+            course, filename, page_number = key
+            text = self.fetch_page(filename, page_number, course)
+            if text is not None:
+                self.cache.put(key, text, prefetched=True)
+            return text
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def prefetch(self, keys: Iterable[PageKey]) -> None:
+        for key in self._expand(keys):
+            if key in self.cache:
+                continue
+            with self._lock:
+                if key in self._pending:
+                    continue
+                self._pending[key] = self._executor.submit(self._load, key)
+
+    def wait(self, key: PageKey) -> Optional[str]:
+        """该页正在预取时等待其完成并返回文本，否则返回 None"""
+        with self._lock:
+            future = self._pending.get(key)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,39 +1,90 @@
 import os
+import sys
+import argparse
 from document_loader import DocumentLoader
 from text_splitter import TextSplitter
 from vector_store import VectorStore
+from deduplicator import ChunkDeduplicator
+from sharded_store import ShardedVectorStore, list_courses
 
-from config import DATA_DIR, CHUNK_SIZE, CHUNK_OVERLAP, VECTOR_DB_PATH
+from config import (
+    DATA_DIR,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    VECTOR_DB_PATH,
+    DEDUP_THRESHOLD,
+    SHARD_BY_COURSE,
+    DEFAULT_COURSE,
+)
 
 
-def main():
-    if not os.path.exists(DATA_DIR):
-        print(f"数据目录不存在: {DATA_DIR}")
-        print("请创建数据目录并放入PDF、PPTX、DOCX或TXT文件")
-        return
-
+def build_index(vector_store: VectorStore, data_dir: str, recursive: bool = True) -> bool:
+    """清空 vector_store 并用 data_dir 下的文档重建，返回是否找到文档"""
     # 初始化组件
     loader = DocumentLoader(
-        data_dir=DATA_DIR,
+        data_dir=data_dir,
     )
     splitter = TextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    vector_store = VectorStore(db_path=VECTOR_DB_PATH)
     vector_store.clear_collection()
 
     # 加载文档
-    documents = loader.load_all_documents()
+    documents = loader.load_all_documents(recursive=recursive)
     if not documents:
         print("未找到任何文档")
-        return
+        return False
 
     # 切分文档
     chunks = splitter.split_documents(documents)
 
+    # 近重复去重，合并重复块的来源
+    if DEDUP_THRESHOLD:
+        chunks = ChunkDeduplicator(threshold=DEDUP_THRESHOLD).deduplicate_chunks(chunks)
+
     # 存储到向量数据库
     vector_store.add_documents(chunks)
-    
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="处理课程资料并构建检索索引")
+    parser.add_argument("--course", action="append", help="只重建指定课程（DATA_DIR 下的子目录名，可重复指定）")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(DATA_DIR):
+        print(f"数据目录不存在: {DATA_DIR}")
+        print("请创建数据目录并放入PDF、PPTX、DOCX或TXT文件")
+        return
+
+    if not SHARD_BY_COURSE:
+        build_index(VectorStore(db_path=VECTOR_DB_PATH), DATA_DIR)
+        print("\n数据处理完成！可以运行main.py开始对话")
+        return
+
+    # 每门课程单独建一个分片，只清空正在重建的分片
+    store = ShardedVectorStore(db_path=VECTOR_DB_PATH)
+    available = list_courses(DATA_DIR)
+    courses = args.course or available
+    for course in courses:
+        if course not in available:
+            print(f"课程目录不存在: {course}")
+            continue
+        print(f"\n===== 课程: {course} =====")
+        is_default = course == DEFAULT_COURSE
+        course_dir = DATA_DIR if is_default else os.path.join(DATA_DIR, course)
+        if build_index(store.shard(course, create=True), course_dir, recursive=not is_default):
+            store.register_course(course)
+        else:
+            store.unregister_course(course)
+
+    # 全量重建时，下线数据目录中已不存在的课程
+    if not args.course:
+        for course in store.courses:
+            if course not in available:
+                print(f"课程目录已删除，移除分片: {course}")
+                store.unregister_course(course)
+
     print("\n数据处理完成！可以运行main.py开始对话")
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
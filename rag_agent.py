@@ -1,81 +1,159 @@
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
-from openai import OpenAI
+from functools import lru_cache
 
 from config import (
-    OPENAI_API_KEY,
-    OPENAI_API_BASE,
     MODEL_NAME,
     TOP_K,
+    SHARD_BY_COURSE,
     MAX_ITER,
 )
 from vector_store import VectorStore
+from sharded_store import ShardedVectorStore
+from deduplicator import parse_sources
+from llm_client import get_shared_client
+from page_cache import PageCache, PagePrefetcher
 import json
 import re
 from colorama import init, Fore, Back, Style
 
 
+# 解析模型回复用的正则，模块加载时编译一次
+NEXT_THOUGHT_RE = re.compile(r'\[\[ ## next_thought ## \]\](.*?)\[\[ ## next_tool_name ## \]\]', re.DOTALL)
+NEXT_TOOL_NAME_RE = re.compile(r'\[\[ ## next_tool_name ## \]\](.*?)\[\[ ## next_tool_args ## \]\]', re.DOTALL)
+NEXT_TOOL_ARGS_RE = re.compile(r'\[\[ ## next_tool_args ## \]\](.*?)\[\[ ## completed ## \]\]', re.DOTALL)
+TRAJECTORY_RE = re.compile(r'\[\[ ## trajectory ## \]\](.*?)\n\nRespond with', re.DOTALL)
+REASONING_RE = re.compile(r'\[\[ ## reasoning ## \]\](.*?)\[\[ ## answer ## \]\]', re.DOTALL)
+ANSWER_RE = re.compile(r'\[\[ ## answer ## \]\](.*?)\[\[ ## completed ## \]\]', re.DOTALL)
+CONTROL_CHARS_RE = re.compile(r'[\r\n\t]+')
+COMMENT_RE = re.compile(r'#.*?$', re.MULTILINE)
+NEWLINES_RE = re.compile(r'[\r\n]+')
+TRAILING_COMMA_OBJ_RE = re.compile(r',\s*}')
+TRAILING_COMMA_ARR_RE = re.compile(r',\s*]')
+
+
+@lru_cache(maxsize=None)
+def load_prompt(name: str) -> str:
+    """读取 prompts/ 下的模板，每个文件只读一次"""
+    return Path("prompts", name).read_text(encoding="utf-8")
+
+
 class RAGAgent:
     def __init__(
         self,
         model: str = MODEL_NAME,
+        course: Optional[str] = None,
     ):
         self.model = model
+        # 指定课程时只检索该课程分片，否则检索所有课程
+        self.course = course
 
-        self.client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_API_BASE)
+        self._client = None
 
-        self.vector_store = VectorStore()
+        self.vector_store = ShardedVectorStore() if SHARD_BY_COURSE else VectorStore()
 
-        self.Docs = {}
+        # 每个会话一个有界 LRU 页面缓存，检索返回后由后台线程预取相关页面
+        self.Docs = PageCache()
+        self.prefetcher = PagePrefetcher(self.Docs, self.fetch_page)
+        # 检索结果中出现过的 (文件名, 页码) -> 课程，lookup 未给出课程时据此定位分片
+        self.page_courses: Dict[Tuple[str, int], Optional[str]] = {}
 
-        
         # 实现并调整提示词，使其符合课程助教的角色和回答策略
-        self.pred0_system = Path("prompts/pred0_system_message.md").read_text(encoding="utf-8")
-        self.pred1_system = Path("prompts/pred1_system_message.md").read_text(encoding="utf-8")
+        self.pred0_system = load_prompt("pred0_system_message.md")
+        self.pred1_system = load_prompt("pred1_system_message.md")
         self.pred0_history = [{"role": "system", "content": self.pred0_system}]
         self.pred1_history = [{"role": "system", "content": self.pred1_system}]
-        self.pred0_user = Path("prompts/pred0_user_message.md").read_text(encoding="utf-8")
-        self.pred1_user = Path("prompts/pred1_user_message.md").read_text(encoding="utf-8")
+        self.pred0_user = load_prompt("pred0_user_message.md")
+        self.pred1_user = load_prompt("pred1_user_message.md")
+        self.trajectory_entry = load_prompt("trajectory_entry.md")
+
+    @property
+    def client(self):
+        # 与 VectorStore 共享连接池与限流器
+        if self._client is None:
+            self._client = get_shared_client()
+        return self._client
 
     def format_res(self, res):
         result = f"filename: {res["metadata"]["filename"]}\npage_number: {res["metadata"]["page_number"]}\ncontent: {res["content"]}"
+        also_in = self.format_also_in(res)
+        if also_in:
+            result += f"\n{also_in}"
         return result
 
+    def format_also_in(self, res) -> str:
+        # 去重时被合并的其他出处，同样可以引用
+        others = parse_sources(res["metadata"])[1:]
+        if not others:
+            return ""
+        return "also_in: " + "; ".join(f"{filename} page {page}" for filename, page in others)
+
+    def fetch_page(self, filename: str, page_number: int, course: Optional[str] = None) -> Optional[str]:
+        # 从向量库的内存缓存中拼出整页文本；知道页面所属课程时只查该课程分片
+        course = course if course is not None else self.course
+        if course is not None:
+            return self.vector_store.get_page(filename, page_number, course=course)
+        return self.vector_store.get_page(filename, page_number)
+
+    def search(self, query: str, top_k: int = TOP_K) -> List[Dict]:
+        if self.course is not None:
+            return self.vector_store.search(query=query, top_k=top_k, course=self.course)
+        return self.vector_store.search(query=query, top_k=top_k)
+
     def search_courseware(self, query: str, top_k: int = TOP_K) -> str:
         # 根据query检索课程资料，前3个结果返回内容，文件名和页码，除此之外返回文件名和页码
 
-        res = self.vector_store.search(query=query, top_k=top_k)
+        res = self.search(query=query, top_k=top_k)
+        # 所有命中页（含去重合并的其他出处）及相邻页交给后台预取，页面按所属课程区分
+        pages = []
+        for r in res:
+            course = r["metadata"].get("course")
+            for filename, page_number in parse_sources(r["metadata"]):
+                self.page_courses[(filename, page_number)] = course
+                pages.append((course, filename, page_number))
+        self.prefetcher.prefetch(pages)
         result = ""
         for i in range(min(3, len(res))):
             result += self.format_res(res[i]) + "\n\n"
-            self.Docs[(res[i]["metadata"]["filename"], res[i]["metadata"]["page_number"])] = res[i]["content"]
             print(Style.DIM + Fore.BLUE + f"{res[i]["metadata"]["filename"]}, page {res[i]["metadata"]["page_number"]}")
         for i in range(3, len(res)):
-            result += f"filename: {res[i]['metadata']['filename']}\npage_number: {res[i]['metadata']['page_number']}\n\n"
-            self.Docs[(res[i]["metadata"]["filename"], res[i]["metadata"]["page_number"])] = res[i]["content"]
+            result += f"filename: {res[i]['metadata']['filename']}\npage_number: {res[i]['metadata']['page_number']}\n"
+            also_in = self.format_also_in(res[i])
+            result += f"{also_in}\n\n" if also_in else "\n"
             print(Style.DIM + Fore.BLUE + f"{res[i]["metadata"]["filename"]}, page {res[i]["metadata"]["page_number"]}")
         return result
 
-    def lookup_courseware(self, filename: str, page_number: int) -> str:
-        # 先在self.Docs中查找，如果没有再检索
+    def lookup_courseware(self, filename: str, page_number: int, course: Optional[str] = None) -> str:
+        # 先在self.Docs中查找（该页正在预取时等待预取完成），如果没有再读取整页，最后才检索
+        try:
+            page_number = int(page_number)
+        except (TypeError, ValueError):
+            pass
+        # 未指定课程时取该页在检索结果中的课程，再退回到会话课程
+        if course is None:
+            course = self.page_courses.get((filename, page_number), self.course)
+        key = (course, filename, page_number)
 
-        if (filename, page_number) in self.Docs:
-            return self.Docs[(filename, page_number)]
-        else:
-            res = self.vector_store.search(query=f"filename:{filename} page_number:{page_number}", top_k=1)
-            if res:
-                self.Docs[(res[0]["metadata"]["filename"], res[0]["metadata"]["page_number"])] = res[0]["content"]
-                return res[0]["content"]
-            else:
-                return ""
+        self.prefetcher.wait(key)
+        text = self.Docs.get(key)
+        if text is not None:
+            return text
+
+        text = self.fetch_page(filename, page_number, course)
+        if text is None:
+            # 检索得到的只是某个语义块，且不一定来自所请求的页，不写入页面缓存
+            res = self.search(query=f"filename:{filename} page_number:{page_number}", top_k=1)
+            return res[0]["content"] if res else ""
+        self.Docs.put(key, text)
+        return text
 
     def get_new_user_message(self, old_user_message: str, response: str, index: int):
         # 识别模型的回复，执行对应的工具调用，并将结果整合为新的用户消息。
 
         # 解析响应中的各个字段
-        next_thought_match = re.search(r'\[\[ ## next_thought ## \]\](.*?)\[\[ ## next_tool_name ## \]\]', response, re.DOTALL)
-        next_tool_name_match = re.search(r'\[\[ ## next_tool_name ## \]\](.*?)\[\[ ## next_tool_args ## \]\]', response, re.DOTALL)
-        next_tool_args_match = re.search(r'\[\[ ## next_tool_args ## \]\](.*?)\[\[ ## completed ## \]\]', response, re.DOTALL)
+        next_thought_match = NEXT_THOUGHT_RE.search(response)
+        next_tool_name_match = NEXT_TOOL_NAME_RE.search(response)
+        next_tool_args_match = NEXT_TOOL_ARGS_RE.search(response)
         
         next_thought = next_thought_match.group(1).strip() if next_thought_match else ""
         next_tool_name = next_tool_name_match.group(1).strip() if next_tool_name_match else ""
@@ -85,15 +163,15 @@ class RAGAgent:
         # 1. 移除 # 注释及其后面的内容
         next_tool_name = next_tool_name.split('#')[0]
         # 2. 移除所有回车和制表符，只保留空格
-        next_tool_name = re.sub(r'[\r\n\t]+', '', next_tool_name)
+        next_tool_name = CONTROL_CHARS_RE.sub('', next_tool_name)
         # 3. 移除引号和多余空白
         next_tool_name = next_tool_name.strip().strip("'\"").strip()
         
         # 清理工具参数 JSON 字符串：移除注释和多余空白
         # 1. 移除 Python 风格注释（# 后面的内容）
-        next_tool_args_str = re.sub(r'#.*?$', '', next_tool_args_str, flags=re.MULTILINE)
+        next_tool_args_str = COMMENT_RE.sub('', next_tool_args_str)
         # 2. 移除多余的回车和空白（保留 JSON 格式需要的空格）
-        next_tool_args_str = re.sub(r'[\r\n]+', ' ', next_tool_args_str)
+        next_tool_args_str = NEWLINES_RE.sub(' ', next_tool_args_str)
         # 3. 最后再 strip 一次
         next_tool_args_str = next_tool_args_str.strip()
         
@@ -103,8 +181,8 @@ class RAGAgent:
         except json.JSONDecodeError as e:
             # 如果 JSON 解析失败，尝试进一步清理（移除可能的尾部逗号）
             try:
-                cleaned_str = re.sub(r',\s*}', '}', next_tool_args_str)
-                cleaned_str = re.sub(r',\s*]', ']', cleaned_str)
+                cleaned_str = TRAILING_COMMA_OBJ_RE.sub('}', next_tool_args_str)
+                cleaned_str = TRAILING_COMMA_ARR_RE.sub(']', cleaned_str)
                 next_tool_args = json.loads(cleaned_str)
             except json.JSONDecodeError:
                 next_tool_args = {}
@@ -130,7 +208,7 @@ class RAGAgent:
                 page_number = next_tool_args.get('page_number', 0)
                 print(Style.DIM + Fore.BLUE + f"Calling tool lookup_courseware with filename: {filename}, page_number: {page_number}")
                 if filename and page_number:
-                    observation = self.lookup_courseware(filename, page_number)
+                    observation = self.lookup_courseware(filename, page_number, next_tool_args.get('course'))
                 else:
                     print(Style.DIM + Fore.BLUE + "Invalid next_tool_args for lookup_courseware.")
                     observation = "Invalid next_tool_args. Tool lookup_courseware takes arguments {'filename': 'str', 'page_number': 'int'} in JSON format."
@@ -144,7 +222,7 @@ class RAGAgent:
             observation = f"Error: {str(e)}"
         
         # 构建新的trajectory条目
-        trajectory_entry = Path("prompts/trajectory_entry.md").read_text(encoding="utf-8").format(
+        trajectory_entry = self.trajectory_entry.format(
             index = index,
             next_thought = next_thought,
             next_tool_name = next_tool_name,
@@ -165,7 +243,7 @@ class RAGAgent:
         self.pred0_history.append({"role": "user", "content": user_message})
         for i in range(MAX_ITER):
             try:
-                response = self.client.chat.completions.create(
+                response = self.client.create_chat_completion(
                     model=self.model, messages=self.pred0_history, temperature=0.7
                 )
             except Exception as e:
@@ -175,7 +253,7 @@ class RAGAgent:
                 break
             self.pred0_history[-1] = {"role": "user", "content": user_message}
         self.pred0_history.append({"role": "assistant", "content": response.choices[0].message.content})
-        trajectory = re.search(r'\[\[ ## trajectory ## \]\](.*?)\n\nRespond with', user_message, re.DOTALL)
+        trajectory = TRAJECTORY_RE.search(user_message)
         return trajectory.group(1).strip() if trajectory else ""
 
     def predictor1(self, query: str, trajectory: str):
@@ -183,16 +261,16 @@ class RAGAgent:
         user_message = self.pred1_user.format(question=query, trajectory=trajectory)
         self.pred1_history.append({"role": "user", "content": user_message})
         try:
-            response = self.client.chat.completions.create(
+            response = self.client.create_chat_completion(
                 model=self.model, messages=self.pred1_history, temperature=0.7
             )
         except Exception as e:
             return f"生成回答时出错: {str(e)}"
         response = response.choices[0].message.content
         self.pred1_history.append({"role": "assistant", "content": response})
-        reasoning = re.search(r'\[\[ ## reasoning ## \]\](.*?)\[\[ ## answer ## \]\]', response, re.DOTALL)
+        reasoning = REASONING_RE.search(response)
         print('\n' + Style.DIM + Fore.BLUE + reasoning.group(1).strip() if reasoning else "")
-        answer = re.search(r'\[\[ ## answer ## \]\](.*?)\[\[ ## completed ## \]\]', response, re.DOTALL)
+        answer = ANSWER_RE.search(response)
         return answer.group(1).strip() if answer else ""
 
     def chat(self) -> None:
@@ -210,6 +288,8 @@ class RAGAgent:
                     continue
 
                 if query == "exit":
+                    print(Style.DIM + Fore.BLUE + self.Docs.format_stats())
+                    self.prefetcher.shutdown()
                     print(Fore.WHITE + Back.BLUE + Style.BRIGHT + "\n感谢使用智能课程助教系统，再见！")
                     break
                 
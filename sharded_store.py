@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+from config import (
+    VECTOR_DB_PATH,
+    COLLECTION_NAME,
+    DATA_DIR,
+    TOP_K,
+    DEFAULT_COURSE,
+    SHARD_MANIFEST,
+)
+from vector_store import VectorStore, rrf_fuse
+
+
+def shard_collection_name(course: str) -> str:
+    """课程名 -> collection 名。ChromaDB 只接受 3~63 位字母数字与 ._-，中文课程名用哈希区分"""
+    if course == DEFAULT_COURSE:
+        return COLLECTION_NAME
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", course).strip("-_")[:32]
+    digest = hashlib.sha1(course.encode("utf-8")).hexdigest()[:8]
+    return f"{COLLECTION_NAME}_{slug}_{digest}" if slug else f"{COLLECTION_NAME}_{digest}"
+
+
+def list_courses(data_dir: str = DATA_DIR) -> List[str]:
+    """DATA_DIR 下的每个子目录是一门课程，根目录下的文件归入 DEFAULT_COURSE"""
+    if not os.path.exists(data_dir):
+        return []
+    courses = []
+    has_root_files = False
+    for entry in sorted(os.listdir(data_dir)):
+        if entry.startswith(".") or entry.startswith("~$"):
+            continue
+        if os.path.isdir(os.path.join(data_dir, entry)):
+            courses.append(entry)
+        else:
+            has_root_files = True
+    if has_root_files:
+        courses.insert(0, DEFAULT_COURSE)
+    return courses
+
+
+class ShardedVectorStore:
+    """[创新点] 多课程分片检索
+
+    每门课程一个分片（独立的 ChromaDB collection、BM25 索引与可选的扁平索引），首次检索时才加载。
+    指定课程时只检索该分片；否则并行取各分片的候选，向量结果按相似度、BM25 结果按归一化得分
+    分别合并成全局排名，再做 RRF 融合。
+    分片清单保存在 VECTOR_DB_PATH/SHARD_MANIFEST 中，每个分片可单独重建。
+    """
+
+    def __init__(self, db_path: str = VECTOR_DB_PATH, max_workers: Optional[int] = None):
+        self.db_path = db_path
+        self.manifest_path = os.path.join(db_path, SHARD_MANIFEST)
+        self.max_workers = max_workers
+        self._shards: Dict[str, VectorStore] = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        # 默认课程分片兼作主分片，其余分片共用它的 OpenAI 与 ChromaDB 客户端
+        self._primary = VectorStore(db_path=db_path, collection_name=COLLECTION_NAME)
+
+    # ---------- 分片清单 ----------
+
+    def load_manifest(self) -> Dict[str, str]:
+        """课程名 -> collection 名
+
+        没有清单时，若存在未分片的旧数据库（COLLECTION_NAME collection），视为只有默认课程；
+        全新安装则为空清单。
+        """
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        if os.path.exists(self.db_path) and COLLECTION_NAME in self._collection_names():
+            return {DEFAULT_COURSE: COLLECTION_NAME}
+        return {}
+
+    def _collection_names(self) -> List[str]:
+        # chromadb < 0.6 返回 Collection 对象，之后的版本只返回名称
+        return [getattr(c, "name", c) for c in self._primary.chroma_client.list_collections()]
+
+    def _save_manifest(self, manifest: Dict[str, str]) -> None:
+        os.makedirs(self.db_path, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def register_course(self, course: str) -> None:
+        # 从 load_manifest() 起步：旧数据库没有清单时保留其默认课程，之后才能被下线
+        manifest = self.load_manifest()
+        manifest[course] = shard_collection_name(course)
+        self._save_manifest(manifest)
+
+    def unregister_course(self, course: str) -> None:
+        """删除分片及其 collection"""
+        manifest = self.load_manifest()
+        # 新课程建库失败时还不在清单中，但 collection 可能已经建出；从未建出时无需删除
+        collection_name = manifest.get(course, shard_collection_name(course))
+        if collection_name in self._collection_names():
+            self.shard(course, create=True).drop_collection()
+        if course in manifest:
+            del manifest[course]
+            self._save_manifest(manifest)
+        with self._lock:
+            self._shards.pop(course, None)
+
+    @property
+    def courses(self) -> List[str]:
+        return list(self.load_manifest())
+
+    # ---------- 分片访问 ----------
+
+    @property
+    def client(self):
+        return self._primary.client
+
+    def shard(self, course: str, create: bool = False) -> VectorStore:
+        """取得课程分片（只创建对象，collection 与索引在首次使用时加载）
+
+        课程不在分片清单中时抛出 ValueError，避免拼错课程名时悄悄建出一个空 collection；
+        process_data 建立新分片时传入 create=True。
+        """
+        with self._lock:
+            store = self._shards.get(course)
+            if store is None:
+                collection_name = self.load_manifest().get(course)
+                if collection_name is None:
+                    if not create:
+                        raise ValueError(f"未知课程: {course}（已有课程: {', '.join(self.courses) or '无'}）")
+                    collection_name = shard_collection_name(course)
+                if collection_name == COLLECTION_NAME:
+                    store = self._primary
+                else:
+                    store = VectorStore(
+                        db_path=self.db_path,
+                        collection_name=collection_name,
+                        chroma_client=self._primary.chroma_client,
+                    )
+                self._shards[course] = store
+            return store
+
+    def load_tokenizer(self) -> None:
+        self._primary.load_tokenizer()
+
+    def ensure_index(self, course: Optional[str] = None, verbose: bool = True) -> None:
+        """构建指定课程的分片索引；不指定时依次构建所有分片"""
+        for c in ([course] if course is not None else self.courses):
+            self.shard(c).ensure_index(verbose=verbose)
+
+    def warm_up(self, course: Optional[str] = None) -> threading.Thread:
+        """后台导入依赖、加载词典，并构建本次会话要检索的分片索引（指定课程时只构建该分片）"""
+        def _warm():
+            try:
+                self.client.client
+                self.load_tokenizer()
+                self.ensure_index(course, verbose=False)
+            except Exception as e:
+                print(f"后台预热失败，将在首次检索时重试: {e}")
+
+        thread = threading.Thread(target=_warm, name="sharded-store-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def get_collection_count(self, course: Optional[str] = None) -> int:
+        if course is not None:
+            return self.shard(course).get_collection_count()
+        return sum(self.shard(c).get_collection_count() for c in self.courses)
+
+    # ---------- 检索 ----------
+
+    def search(self, query: str, top_k: int = TOP_K, course: Optional[str] = None) -> List[Dict]:
+        """指定 course 时只检索该分片，否则并行检索所有分片并全局融合"""
+        courses = [course] if course is not None else self.courses
+        if not courses:
+            return []
+        if len(courses) == 1:
+            results = self.shard(courses[0]).hybrid_search(query, top_k)
+            for res in results:
+                res["metadata"].setdefault("course", courses[0])
+            return results
+
+        # 查询向量只计算一次，各分片共用
+        query_embedding = self._primary.get_embedding(query)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers or min(8, len(courses)), thread_name_prefix="shard-search"
+                    )
+        n = top_k * 2
+        futures = {
+            c: self._executor.submit(self.shard(c).search_candidates, query, n, query_embedding)
+            for c in courses
+        }
+
+        # 各分片共用同一查询向量与相似度度量，向量结果可以合在一起按相似度全局排名；
+        # BM25 的 idf 依赖各分片自己的语料，按各分片中该查询的得分上界归一化 (bm25_score) 后再合并排名
+        vector_results, bm25_results = [], []
+        for c, future in futures.items():
+            try:
+                shard_vector, shard_bm25 = future.result()
+            except Exception as e:
+                print(f"检索课程 {c} 失败: {e}")
+                continue
+            vector_results.extend(((c, item["id"]), (c, item)) for item in shard_vector)
+            bm25_results.extend(((c, item["id"]), (c, item)) for item in shard_bm25)
+        vector_results.sort(key=lambda entry: entry[1][1]["similarity"], reverse=True)
+        bm25_results.sort(key=lambda entry: entry[1][1]["bm25_score"], reverse=True)
+
+        # 与单库检索一样只融合两路名次，每门课程的 BM25 第一名不会各自得到一整票
+        results = []
+        for (c, item), score in rrf_fuse([vector_results[:n], bm25_results[:n]], top_k):
+            res = self.shard(c).materialize(item)
+            res["metadata"].setdefault("course", c)
+            res["score"] = score
+            results.append(res)
+        return results
+
+    def get_page(self, filename: str, page_number: int, course: Optional[str] = None) -> Optional[str]:
+        """取整页文本；只有不知道页面属于哪门课程时才依次在各分片中查找"""
+        if course is not None:
+            return self.shard(course).get_page(filename, page_number)
+        for c in self.courses:
+            text = self.shard(c).get_page(filename, page_number)
+            if text is not None:
+                return text
+        return None
@@ -0,0 +1,78 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from chunk_store import ChunkStore, BM25Index
+
+
+def make_corpus(n_docs: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(60)] + ["机器学习", "梯度", "损失", "注意力"]
+    return [[rng.choice(vocab) for _ in range(rng.randint(1, 40))] for _ in range(n_docs)]
+
+
+def test_bm25_matches_rank_bm25():
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    corpus = make_corpus(300)
+    reference = rank_bm25.BM25Okapi(corpus)
+    index = BM25Index().build(corpus)
+
+    rng = random.Random(1)
+    queries = [rng.sample(sorted({t for doc in corpus for t in doc}), 3) for _ in range(20)]
+    queries.append(["不存在的词", "w1"])
+    for query in queries:
+        np.testing.assert_allclose(index.get_scores(query), reference.get_scores(query), rtol=1e-4, atol=1e-5)
+
+
+def test_bm25_top_n_orders_by_score_and_skips_zero():
+    corpus = [["a", "b"], ["c"], ["a", "a", "d"], ["e"], ["f"], ["g", "h"]]
+    index = BM25Index().build(corpus)
+    scores = index.get_scores(["a"])
+    top = index.top_n(["a"], 10)
+    assert sorted(top) == [0, 2]
+    assert scores[top[0]] >= scores[top[1]]
+    assert index.top_n(["zzz"], 3) == []
+
+
+def meta(filename, page, chunk_id, **extra):
+    return dict(filename=filename, filepath=f"./data/{filename}", filetype=".pdf",
+                page_number=page, chunk_id=chunk_id, **extra)
+
+
+def test_chunk_store_round_trip():
+    store = ChunkStore()
+    store.append("a_p1_c0", "第一块", meta("a.pdf", 1, 0))
+    store.append("b_p2_c1", "second chunk", meta("b.pdf", 2, 1, sources=json.dumps([["b.pdf", 2, 1], ["a.pdf", 3, 0]]), duplicate_count=1))
+    store.freeze()
+
+    assert len(store) == 2
+    assert list(store.ids()) == ["a_p1_c0", "b_p2_c1"]
+    assert store.get(0) == {"id": "a_p1_c0", "content": "第一块", "metadata": meta("a.pdf", 1, 0)}
+    assert store.metadata(1)["duplicate_count"] == 1
+    assert store.nbytes() > 0
+
+
+def test_page_rows_include_merged_duplicates():
+    store = ChunkStore()
+    store.append("a2", "p1 c2", meta("a.pdf", 1, 2))
+    store.append("a1", "p1 c1", meta("a.pdf", 1, 1))
+    # a.pdf 第 1 页的第 0 块与 b.pdf 第 5 页的第 5 块重复，被合并进后者
+    store.append("b5", "dup", meta("b.pdf", 5, 5, sources=json.dumps([["b.pdf", 5, 5], ["a.pdf", 1, 0]]), duplicate_count=1))
+    store.append("p2", "p2", meta("a.pdf", 2, 0))
+    store.freeze()
+
+    # 合并进来的块按它在 a.pdf 第 1 页的 chunk_id 0 排在最前，而不是按规范块的 chunk_id 5
+    assert store.page_rows("a.pdf", 1) == [2, 1, 0]
+    assert store.page_rows("b.pdf", 5) == [2]
+    assert store.page_rows("missing.pdf", 1) == []
+
+
+def test_bm25_max_score_bounds_scores_and_penalises_missing_terms():
+    corpus = make_corpus(200)
+    index = BM25Index().build(corpus)
+    query = ["w1", "w2", "机器学习"]
+    assert index.get_scores(query).max() <= index.max_score(query)
+    # 语料中没有的词按最高 idf 计入上界
+    assert index.max_score(query + ["不存在的词"]) > index.max_score(query) + index.idf.max() * (index.k1 + 1)
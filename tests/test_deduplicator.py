@@ -0,0 +1,83 @@
+import json
+import random
+
+import pytest
+
+from deduplicator import ChunkDeduplicator, parse_sources, parse_source_chunks
+
+BASE = ("机器学习是人工智能的一个分支，研究计算机如何从数据中自动学习规律并做出预测。"
+        "本节介绍监督学习与无监督学习的区别，以及训练集、验证集和测试集的划分方法。")
+
+
+def chunk(content, filename, page_number, chunk_id=0):
+    return {"content": content, "filename": filename, "filepath": f"./data/{filename}", "filetype": ".pdf",
+            "page_number": page_number, "chunk_id": chunk_id}
+
+
+def random_text(seed, length=120):
+    rng = random.Random(seed)
+    return "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(length))
+
+
+def test_near_duplicates_collapse_and_merge_sources():
+    chunks = [
+        chunk(BASE, "lecture01.pptx", 3, 1),
+        chunk(random_text(1), "lecture01.pptx", 4, 0),
+        chunk(BASE + "。", "lecture01.pdf", 3, 2),  # PDF 导出版，只差一个标点
+        chunk(BASE.replace("。", "。\n  "), "review.pdf", 10, 0),  # 只有换行与空白不同
+    ]
+    deduped, removed = ChunkDeduplicator().deduplicate(chunks)
+
+    assert removed == 2
+    assert [c["page_number"] for c in deduped] == [3, 4]
+    canonical = deduped[0]
+    assert canonical["duplicate_count"] == 2
+    assert parse_source_chunks(canonical) == [("lecture01.pptx", 3, 1), ("lecture01.pdf", 3, 2), ("review.pdf", 10, 0)]
+    assert parse_sources(canonical) == [("lecture01.pptx", 3), ("lecture01.pdf", 3), ("review.pdf", 10)]
+
+
+def test_distinct_chunks_are_kept_without_extra_metadata():
+    chunks = [chunk(random_text(seed), "a.pdf", seed) for seed in range(20)]
+    deduped, removed = ChunkDeduplicator().deduplicate(chunks)
+
+    assert removed == 0
+    assert len(deduped) == 20
+    assert all("sources" not in c and "duplicate_count" not in c for c in deduped)
+    assert parse_sources(deduped[5]) == [("a.pdf", 5)]
+
+
+def test_repeated_chunk_on_same_page_keeps_one_source_per_chunk():
+    chunks = [chunk(BASE, "a.pdf", 1, 0), chunk(BASE, "a.pdf", 1, 0), chunk(BASE, "a.pdf", 1, 3)]
+    deduped, removed = ChunkDeduplicator().deduplicate(chunks)
+
+    assert removed == 2
+    assert deduped[0]["duplicate_count"] == 2
+    assert json.loads(deduped[0]["sources"]) == [["a.pdf", 1, 0], ["a.pdf", 1, 3]]
+    assert parse_sources(deduped[0]) == [("a.pdf", 1)]
+
+
+def test_threshold_is_respected():
+    # 约一半内容相同：Jaccard 相似度远低于默认阈值 0.8，但高于 0.2
+    half = BASE[:len(BASE) // 2] + random_text(7, len(BASE) // 2)
+    chunks = [chunk(BASE, "a.pdf", 1), chunk(half, "b.pdf", 2)]
+
+    strict = ChunkDeduplicator(threshold=0.8)
+    assert strict.deduplicate(chunks)[1] == 0
+    # 阈值很低时需要足够多的 band 才能让 LSH 找到候选
+    loose = ChunkDeduplicator(threshold=0.2, num_perm=128, bands=64)
+    assert loose.deduplicate(chunks)[1] == 1
+
+
+def test_signature_estimates_jaccard():
+    dedup = ChunkDeduplicator(num_perm=256, bands=32)
+    a, b = dedup._shingles(BASE), dedup._shingles(BASE[:len(BASE) * 3 // 4])
+    exact = len(set(a.tolist()) & set(b.tolist())) / len(set(a.tolist()) | set(b.tolist()))
+    estimate = (dedup.signature(BASE) == dedup.signature(BASE[:len(BASE) * 3 // 4])).mean()
+    assert estimate == pytest.approx(exact, abs=0.1)
+
+
+def test_empty_chunks_are_dropped_and_bands_validated():
+    deduped, removed = ChunkDeduplicator().deduplicate([chunk("   ", "a.pdf", 1), chunk(BASE, "a.pdf", 2)])
+    assert [c["page_number"] for c in deduped] == [2]
+    with pytest.raises(ValueError):
+        ChunkDeduplicator(num_perm=100, bands=16)
@@ -0,0 +1,100 @@
+import gzip
+import os
+
+import pytest
+
+pytest.importorskip("pdfplumber")
+pytest.importorskip("docx2txt")
+pytest.importorskip("pptx")
+
+import document_loader
+from document_loader import DocumentLoader
+
+
+@pytest.fixture
+def loader(tmp_path, monkeypatch):
+    """_parse_document 换成计数的替身，只测试缓存逻辑"""
+    loader = DocumentLoader(data_dir=str(tmp_path / "data"), cache_dir=str(tmp_path / "cache"), pdf_backend="pdfplumber")
+    loader.parse_calls = 0
+    loader.pages = ["第一页内容", "second page"]
+
+    def parse(file_path, ext, filename):
+        loader.parse_calls += 1
+        return [
+            {"content": text, "filename": filename, "filepath": file_path, "filetype": ext, "page_number": i}
+            for i, text in enumerate(loader.pages, 1)
+        ]
+
+    monkeypatch.setattr(loader, "_parse_document", parse)
+    return loader
+
+
+def write_file(tmp_path, name, data=b"%PDF-1.4 fake"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def cache_files(loader):
+    return [os.path.join(root, f) for root, _, files in os.walk(loader.cache_dir) for f in files]
+
+
+def test_second_load_hits_cache(loader, tmp_path):
+    path = write_file(tmp_path, "a.pdf")
+    first = loader.load_document(path)
+    second = loader.load_document(path)
+    assert loader.parse_calls == 1
+    assert second == first
+    assert [d["page_number"] for d in second] == [1, 2]
+
+
+def test_cache_is_keyed_by_content_not_path(loader, tmp_path):
+    loader.load_document(write_file(tmp_path, "a.pdf"))
+    docs = loader.load_document(write_file(tmp_path, "copy.pdf"))
+    assert loader.parse_calls == 1
+    assert docs[0]["filename"] == "copy.pdf"
+    loader.load_document(write_file(tmp_path, "a.pdf", b"%PDF-1.4 edited"))
+    assert loader.parse_calls == 2
+
+
+def test_loader_version_change_invalidates_cache(loader, tmp_path, monkeypatch):
+    path = write_file(tmp_path, "a.pdf")
+    loader.load_document(path)
+    monkeypatch.setattr(document_loader, "LOADER_VERSION", "test-next")
+    loader.load_document(path)
+    assert loader.parse_calls == 2
+
+
+def test_pdf_backend_change_invalidates_pdf_cache_only(loader, tmp_path):
+    pdf = write_file(tmp_path, "a.pdf")
+    txt = write_file(tmp_path, "notes.txt", "讲义".encode("utf-8"))
+    loader.load_document(pdf)
+    loader.load_document(txt)
+    loader.pdf_backend = "pymupdf"
+    loader.load_document(pdf)
+    loader.load_document(txt)
+    assert loader.parse_calls == 3
+
+
+def test_empty_parse_is_not_cached(loader, tmp_path):
+    path = write_file(tmp_path, "broken.pdf")
+    loader.pages = []
+    assert loader.load_document(path) == []
+    assert cache_files(loader) == []
+    loader.pages = ["recovered"]
+    assert loader.load_document(path)[0]["content"] == "recovered"
+    assert loader.parse_calls == 2
+
+
+def test_corrupt_cache_file_is_reparsed_and_rewritten(loader, tmp_path):
+    path = write_file(tmp_path, "a.pdf")
+    loader.load_document(path)
+    (cache_path,) = cache_files(loader)
+    with open(cache_path, "wb") as f:
+        f.write(b"\x1f\x8b\x08 truncated gzip")
+    assert loader.load_document(path)[1]["content"] == "second page"
+    assert loader.parse_calls == 2
+    with gzip.open(cache_path, "rt", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 3  # 版本头 + 2 页
+    assert loader.load_document(path)
+    assert loader.parse_calls == 2
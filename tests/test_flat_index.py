@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pytest
+
+from flat_index import FlatIndex
+
+
+def make_vectors(n=500, dim=64, seed=0):
+    rng = np.random.RandomState(seed)
+    ids = [f"doc{i}" for i in range(n)]
+    return ids, rng.randn(n, dim).astype(np.float32)
+
+
+def exact_top_k(embeddings, query, k):
+    normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    scores = normed @ (query / np.linalg.norm(query))
+    return list(np.argsort(-scores)[:k]), scores
+
+
+@pytest.mark.parametrize("dtype,min_recall", [("float16", 0.95), ("int8", 0.8)])
+def test_top_k_matches_exact_search(tmp_path, dtype, min_recall):
+    ids, embeddings = make_vectors()
+    index = FlatIndex(str(tmp_path), dtype=dtype)
+    index.build(ids, embeddings)
+
+    rng = np.random.RandomState(1)
+    recalls = []
+    for _ in range(20):
+        query = embeddings[rng.randint(len(ids))] + 0.3 * rng.randn(embeddings.shape[1]).astype(np.float32)
+        expected, exact_scores = exact_top_k(embeddings, query, 10)
+        hits = index.search(query.tolist(), 10)
+        assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+        for row, score in hits:
+            assert score == pytest.approx(exact_scores[row], abs=0.02)
+        recalls.append(len({row for row, _ in hits} & set(expected)) / 10)
+    assert np.mean(recalls) >= min_recall
+
+
+def test_int8_rescoring_uses_exact_embeddings(tmp_path):
+    ids, embeddings = make_vectors()
+    index = FlatIndex(str(tmp_path), dtype="int8")
+    index.build(ids, embeddings)
+    by_id = dict(zip(ids, embeddings.tolist()))
+    fetched = []
+
+    def fetch_embeddings(requested):
+        fetched.append(list(requested))
+        return [by_id[doc_id] for doc_id in requested]
+
+    query = embeddings[7] + 0.1
+    hits = index.search(query.tolist(), 10, rescore_factor=4, fetch_embeddings=fetch_embeddings)
+    expected, exact_scores = exact_top_k(embeddings, query, 10)
+
+    assert len(fetched) == 1 and len(fetched[0]) == 40
+    assert [row for row, _ in hits] == expected
+    for row, score in hits:
+        assert score == pytest.approx(float(exact_scores[row]), abs=1e-5)
+
+
+def test_load_round_trip_and_clear(tmp_path):
+    ids, embeddings = make_vectors(50)
+    FlatIndex(str(tmp_path), dtype="int8").build(ids, embeddings)
+    index = FlatIndex(str(tmp_path), dtype="int8")
+    assert index.load()
+    assert index.ids == ids and len(index) == 50
+    index.clear()
+    assert len(index) == 0
+    assert not FlatIndex(str(tmp_path), dtype="int8").load()
+
+
+def test_load_rejects_mismatched_files(tmp_path):
+    ids, embeddings = make_vectors(50)
+    index = FlatIndex(str(tmp_path), dtype="float16")
+    index.build(ids, embeddings)
+
+    # ids 与向量行数不一致
+    with open(index._ids_path, "w", encoding="utf-8") as f:
+        json.dump(ids[:-1], f)
+    assert not FlatIndex(str(tmp_path), dtype="float16").load()
+
+    # 损坏的向量文件
+    index.build(ids, embeddings)
+    with open(index._vectors_path, "wb") as f:
+        f.write(b"not a npy file")
+    assert not FlatIndex(str(tmp_path), dtype="float16").load()
+
+    # 另一种量化类型的文件不会被误用
+    index.build(ids, embeddings)
+    assert not FlatIndex(str(tmp_path), dtype="int8").load()
+
+
+def test_rebuilding_with_chroma_backend_invalidates_flat_files(tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    pytest.importorskip("jieba")
+    import vector_store
+
+    def fake_embedding(self, text):
+        vector = np.zeros(32)
+        for word in text.split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 32] += 1
+        return vector.tolist()
+
+    monkeypatch.setattr(vector_store.VectorStore, "get_embedding", fake_embedding)
+
+    def build(backend, texts):
+        store = vector_store.VectorStore(db_path=str(tmp_path), collection_name="test", dense_backend=backend)
+        store.clear_collection()
+        store.add_documents([
+            {"content": text, "filename": "a.pdf", "filepath": "", "filetype": ".pdf", "page_number": i, "chunk_id": 0}
+            for i, text in enumerate(texts)
+        ])
+        return store
+
+    build("flat", ["alpha beta", "gamma delta"])
+    assert os.path.isdir(os.path.join(str(tmp_path), "flat_test"))
+    # 以 chroma 后端重建：id 不变、内容变了，旧的扁平索引必须失效
+    build("chroma", ["gamma delta", "alpha beta"])
+    assert not os.path.exists(os.path.join(str(tmp_path), "flat_test"))
+
+    store = vector_store.VectorStore(db_path=str(tmp_path), collection_name="test", dense_backend="flat")
+    results = store.search("alpha beta", 1)
+    assert results[0]["content"] == "alpha beta"
+    assert results[0]["metadata"]["page_number"] == 1
@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+import openai
+
+from llm_client import SharedClient, TokenBucket
+
+EMBEDDING_RESPONSE = {
+    "object": "list",
+    "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2]}],
+    "model": "fake",
+    "usage": {"prompt_tokens": 1, "total_tokens": 1},
+}
+
+
+class FakeServer:
+    """本地 OpenAI 兼容接口：前 throttle 次请求返回 429 与给定的 Retry-After，之后返回 embedding"""
+
+    def __init__(self, throttle: int, retry_after: str):
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.request_times = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                server.request_times.append(time.monotonic())
+                if len(server.request_times) <= server.throttle:
+                    body = b'{"error": {"message": "rate limited"}}'
+                    self.send_response(429)
+                    self.send_header("Retry-After", server.retry_after)
+                else:
+                    body = json.dumps(EMBEDDING_RESPONSE).encode()
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_base = f"http://127.0.0.1:{self.httpd.server_port}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_client(api_base: str, **kwargs) -> SharedClient:
+    options = dict(embedding_rate=0, max_retries=3, backoff_base=0.01, backoff_max=0.01)
+    options.update(kwargs)
+    return SharedClient(api_key="test", api_base=api_base, **options)
+
+
+def test_retries_429_and_waits_for_retry_after():
+    with FakeServer(throttle=2, retry_after="0.3") as server:
+        client = make_client(server.api_base)
+        response = client.create_embedding(input="x", model="fake")
+
+    assert response.data[0].embedding == [0.1, 0.2]
+    stats = client.stats["embeddings"]
+    assert stats["requests"] == 3
+    assert stats["throttled"] == 2
+    assert stats["retries"] == 2
+    assert stats["failures"] == 0
+    # Retry-After 大于 backoff_max 时仍按 Retry-After 等待
+    gaps = [b - a for a, b in zip(server.request_times, server.request_times[1:])]
+    assert all(gap >= 0.3 for gap in gaps)
+
+
+def test_gives_up_when_retries_exhausted():
+    with FakeServer(throttle=10, retry_after="0") as server:
+        client = make_client(server.api_base, max_retries=2)
+        with pytest.raises(openai.RateLimitError):
+            client.create_embedding(input="x", model="fake")
+
+    stats = client.stats["embeddings"]
+    assert stats["requests"] == 3
+    assert stats["throttled"] == 3
+    assert stats["retries"] == 2
+    assert stats["failures"] == 1
+
+
+def test_gives_up_when_retry_after_exceeds_maximum():
+    with FakeServer(throttle=1, retry_after="120") as server:
+        client = make_client(server.api_base, retry_after_max=60)
+        start = time.monotonic()
+        with pytest.raises(openai.RateLimitError):
+            client.create_embedding(input="x", model="fake")
+
+    assert time.monotonic() - start < 5
+    stats = client.stats["embeddings"]
+    assert stats["requests"] == 1
+    assert stats["retries"] == 0
+    assert stats["failures"] == 1
+
+
+def test_token_bucket_limits_request_rate():
+    with FakeServer(throttle=0, retry_after="0") as server:
+        client = make_client(server.api_base)
+        client.limiters["embeddings"] = TokenBucket(rate=10, capacity=1)
+        for _ in range(3):
+            client.create_embedding(input="x", model="fake")
+
+    # 令牌桶只积攒 1 个令牌：第一次请求立即发出，之后每次约等待 0.1 秒
+    assert client.stats["embeddings"]["rate_limit_wait"] >= 0.15
+    assert server.request_times[-1] - server.request_times[0] >= 0.15
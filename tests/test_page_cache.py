@@ -0,0 +1,53 @@
+import threading
+
+from page_cache import PageCache, PagePrefetcher
+
+
+def test_lru_evicts_by_pages_and_bytes():
+    cache = PageCache(max_pages=2, max_bytes=10)
+    cache.put(("c", "a.pdf", 1), "12345")
+    cache.put(("c", "a.pdf", 2), "12345")
+    assert cache.get(("c", "a.pdf", 1)) == "12345"  # 1 变为最近使用
+    cache.put(("c", "a.pdf", 3), "x")
+    assert ("c", "a.pdf", 2) not in cache
+    assert ("c", "a.pdf", 1) in cache and ("c", "a.pdf", 3) in cache
+    cache.put(("c", "a.pdf", 4), "x" * 11)  # 超过 max_bytes 的页不缓存
+    assert ("c", "a.pdf", 4) not in cache
+    assert cache.stats["evictions"] == 1
+
+
+def test_same_filename_in_different_courses_is_cached_separately():
+    cache = PageCache()
+    cache.put(("nlp", "lecture01.pdf", 3), "nlp page")
+    cache.put(("db", "lecture01.pdf", 3), "db page")
+    assert cache.get(("nlp", "lecture01.pdf", 3)) == "nlp page"
+    assert cache.get(("db", "lecture01.pdf", 3)) == "db page"
+
+
+def test_expand_yields_hit_pages_before_adjacent_pages():
+    prefetcher = PagePrefetcher(PageCache(), lambda *args: None, adjacent=1)
+    keys = list(prefetcher._expand([("c", "a.pdf", 5), ("c", "b.pdf", 0), ("c", "a.pdf", 6)]))
+    assert keys[:3] == [("c", "a.pdf", 5), ("c", "b.pdf", 0), ("c", "a.pdf", 6)]
+    assert keys[3:] == [("c", "a.pdf", 4), ("c", "b.pdf", 1), ("c", "a.pdf", 7)]
+    prefetcher.shutdown()
+
+
+def test_prefetch_passes_course_and_counts_prefetch_hits():
+    calls = []
+    loaded = threading.Event()
+
+    def fetch_page(filename, page_number, course):
+        calls.append((course, filename, page_number))
+        if len(calls) == 3:
+            loaded.set()
+        return f"{course}/{filename}/{page_number}"
+
+    cache = PageCache()
+    prefetcher = PagePrefetcher(cache, fetch_page, adjacent=1)
+    prefetcher.prefetch([("nlp", "a.pdf", 2)])
+    assert loaded.wait(5)
+    prefetcher.wait(("nlp", "a.pdf", 3))
+    assert calls == [("nlp", "a.pdf", 2), ("nlp", "a.pdf", 1), ("nlp", "a.pdf", 3)]
+    assert cache.get(("nlp", "a.pdf", 2)) == "nlp/a.pdf/2"
+    assert cache.stats["prefetch_hits"] == 1
+    prefetcher.shutdown()
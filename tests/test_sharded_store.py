@@ -0,0 +1,147 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from config import COLLECTION_NAME, DEFAULT_COURSE
+from sharded_store import ShardedVectorStore, shard_collection_name
+from vector_store import rrf_fuse
+
+
+class FakeShard:
+    """只提供 search_candidates / materialize / get_page / ensure_index 的分片替身"""
+
+    def __init__(self, name, vector_results, bm25_results=(), pages=None):
+        self.name = name
+        self.vector_results = [{"id": doc_id, "row": row, "similarity": sim} for row, (doc_id, sim) in enumerate(vector_results)]
+        self.bm25_results = [{"id": doc_id, "row": row, "bm25_score": score} for row, (doc_id, score) in enumerate(bm25_results)]
+        self.pages = pages or {}
+        self.page_requests = []
+        self.index_builds = 0
+
+    def ensure_index(self, verbose=True):
+        self.index_builds += 1
+
+    def search_candidates(self, query, n, query_embedding=None):
+        return self.vector_results[:n], self.bm25_results[:n]
+
+    def materialize(self, item):
+        return {"content": f"{self.name}:{item['id']}", "metadata": {"filename": item["id"], "page_number": 1}}
+
+    def get_page(self, filename, page_number):
+        self.page_requests.append((filename, page_number))
+        return self.pages.get((filename, page_number))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ShardedVectorStore(db_path=str(tmp_path))
+    monkeypatch.setattr(store._primary, "get_embedding", lambda text: [1.0, 0.0])
+    return store
+
+
+def add_shards(store, **shards):
+    store._save_manifest({course: shard_collection_name(course) for course in shards})
+    store._shards.update(shards)
+
+
+def test_fan_out_ranks_dense_results_globally(store):
+    add_shards(
+        store,
+        a=FakeShard("a", [("a0", 0.9), ("a1", 0.85), ("a2", 0.8)]),
+        b=FakeShard("b", [("b0", 0.2)]),
+    )
+    results = store.search("query", top_k=3)
+    # b 分片的第一名相似度远低于 a 的前三名，不能因为是分片内第一而排进 top-3
+    assert [r["content"] for r in results] == ["a:a0", "a:a1", "a:a2"]
+    assert [r["metadata"]["course"] for r in results] == ["a", "a", "a"]
+
+
+def test_fan_out_fuses_per_shard_bm25_ranks(store):
+    add_shards(
+        store,
+        a=FakeShard("a", [("a0", 0.9), ("a1", 0.8)]),
+        b=FakeShard("b", [("b0", 0.85)], bm25_results=[("b0", 0.6)]),
+    )
+    results = store.search("query", top_k=2)
+    # b0 的向量全局名次为 2，并且是唯一的 BM25 命中，融合后排在最前
+    assert [r["content"] for r in results] == ["b:b0", "a:a0"]
+
+
+def test_fan_out_merges_bm25_hits_of_all_courses_into_one_ranking(store):
+    nlp_dense = [(f"a{i}", 0.9 - 0.04 * i) for i in range(6)]
+    nlp_bm25 = [(f"a{i}", 0.8 - 0.05 * i) for i in range(6)]
+    add_shards(
+        store,
+        nlp=FakeShard("nlp", nlp_dense, bm25_results=nlp_bm25),
+        db=FakeShard("db", [("b0", 0.2), ("b1", 0.19)], bm25_results=[("b0", 0.15), ("b1", 0.1)]),
+        os=FakeShard("os", [("c0", 0.18)], bm25_results=[("c0", 0.12)]),
+    )
+    results = store.search("query", top_k=6)
+    # 每门课程的 BM25 第一名不再各得一整票，无关课程挤不掉相关的语义块
+    assert [r["content"] for r in results] == [f"nlp:a{i}" for i in range(6)]
+
+
+def test_rrf_fuse_keeps_first_candidate_and_sums_ranks():
+    fused = rrf_fuse([[("x", {"from": "dense"}), ("y", {})], [("y", {}), ("x", {"from": "bm25"})]], top_k=2)
+    # 两路名次之和相同，同分时保持先出现的顺序；同一 key 保留第一路的候选
+    assert [item for item, _ in fused] == [{"from": "dense"}, {}]
+    assert [score for _, score in fused] == [pytest.approx(1 / 60 + 1 / 61)] * 2
+
+
+def test_unknown_course_is_rejected(store):
+    add_shards(store, a=FakeShard("a", []))
+    with pytest.raises(ValueError):
+        store.shard("typo")
+    assert "typo" not in store._shards
+    assert store.shard("new", create=True).collection_name == shard_collection_name("new")
+
+
+def read_manifest(store):
+    with open(store.manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_register_course_keeps_legacy_default(store):
+    pytest.importorskip("chromadb")
+    # 旧数据库没有清单，只有未分片的默认 collection
+    store._primary.chroma_client.create_collection(COLLECTION_NAME)
+    assert store.courses == [DEFAULT_COURSE]
+    store.register_course("a")
+    assert read_manifest(store) == {DEFAULT_COURSE: COLLECTION_NAME, "a": shard_collection_name("a")}
+
+
+def test_fresh_install_has_no_default_course(store):
+    pytest.importorskip("chromadb")
+    assert store.courses == []
+    store.register_course("NLP")
+    assert read_manifest(store) == {"NLP": shard_collection_name("NLP")}
+
+
+def test_unregister_skips_collections_that_were_never_created(store, capsys):
+    pytest.importorskip("chromadb")
+    store.register_course("NLP")
+    store.unregister_course(DEFAULT_COURSE)
+    store.unregister_course("NLP")
+    assert "出错" not in capsys.readouterr().out
+    assert read_manifest(store) == {}
+
+
+def test_session_course_limits_index_warm_up(store, monkeypatch):
+    a, b = FakeShard("a", []), FakeShard("b", [])
+    add_shards(store, a=a, b=b)
+    monkeypatch.setattr(store, "load_tokenizer", lambda: None)
+    monkeypatch.setattr(store._primary, "_client", SimpleNamespace(client=None))
+    store.warm_up("b").join(5)
+    assert (a.index_builds, b.index_builds) == (0, 1)
+    store.ensure_index()
+    assert (a.index_builds, b.index_builds) == (1, 2)
+
+
+def test_get_page_only_scans_all_shards_without_course(store):
+    a = FakeShard("a", [], pages={("x.pdf", 1): "from a"})
+    b = FakeShard("b", [], pages={("x.pdf", 1): "from b"})
+    add_shards(store, a=a, b=b)
+    assert store.get_page("x.pdf", 1, course="b") == "from b"
+    assert a.page_requests == []
+    assert store.get_page("x.pdf", 1) == "from a"
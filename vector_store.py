@@ -1,14 +1,14 @@
 import os
-from typing import List, Dict, Any
+import shutil
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Hashable, Iterable
 
-import chromadb
-from chromadb.config import Settings
-from openai import OpenAI
 from tqdm import tqdm
 
-import jieba
-from rank_bm25 import BM25Okapi
-# ================
+from llm_client import SharedClient, get_shared_client
+from chunk_store import ChunkStore, BM25Index
+
+# chromadb、openai、jieba 导入较慢，均在首次使用时再导入，加快 main.py 启动
 
 from config import (
     VECTOR_DB_PATH,
@@ -17,9 +17,29 @@ from config import (
     OPENAI_API_BASE,
     OPENAI_EMBEDDING_MODEL,
     TOP_K,
+    CHUNK_OVERLAP,
+    DENSE_BACKEND,
+    FLAT_INDEX_DTYPE,
+    FLAT_INDEX_RESCORE,
 )
 
 
+def rrf_fuse(ranked_lists: Iterable[List[Tuple[Hashable, Dict]]], top_k: int, k: int = 60) -> List[Tuple[Dict, float]]:
+    """RRF 融合 (Reciprocal Rank Fusion)：Score = Σ 1 / (rank + k)，取k=60
+
+    ranked_lists 中每一路是按名次排好的 (key, 候选) 列表，同一 key 出现在多路时保留最先出现的候选。
+    返回分数最高的 top_k 个 (候选, 融合分数)。
+    """
+    combined_scores = {}
+    all_docs_map = {}
+    for ranked in ranked_lists:
+        for rank, (key, item) in enumerate(ranked):
+            combined_scores[key] = combined_scores.get(key, 0) + 1 / (rank + k)
+            all_docs_map.setdefault(key, item)
+    sorted_keys = sorted(combined_scores, key=lambda x: combined_scores[x], reverse=True)[:top_k]
+    return [(all_docs_map[key], combined_scores[key]) for key in sorted_keys]
+
+
 class VectorStore:
 
     def __init__(
@@ -28,63 +48,209 @@ class VectorStore:
         collection_name: str = COLLECTION_NAME,
         api_key: str = OPENAI_API_KEY,
         api_base: str = OPENAI_API_BASE,
+        dense_backend: str = DENSE_BACKEND,
+        chroma_client=None,
     ):
         self.db_path = db_path
         self.collection_name = collection_name
+        if dense_backend not in ("chroma", "flat"):
+            raise ValueError(f"不支持的稠密检索后端: {dense_backend}")
+        self.dense_backend = dense_backend
+        self.api_key = api_key
+        self.api_base = api_base
+
+        # OpenAI 客户端与 ChromaDB 在首次访问时创建；多个分片可共用同一个 chroma_client
+        self._client = None
+        self._chroma_client = chroma_client
+        self._collection = None
+        self._init_lock = threading.RLock()
+
+        # 扁平索引与 chunks 按行对齐，ChromaDB 仍是数据的唯一来源
+        self.flat_index = None
+        self.flat_index_dir = os.path.join(db_path, f"flat_{collection_name}")
+        if dense_backend == "flat":
+            from flat_index import FlatIndex
+            self.flat_index = FlatIndex(self.flat_index_dir, dtype=FLAT_INDEX_DTYPE)
+
+        # === 创新点：BM25 索引，首次检索时构建（或由 warm_up 在后台预先构建） ===
+        self.bm25 = None
+        self.chunks = ChunkStore()  # 列式存储文档内容与元数据，按行号与 BM25 / 扁平索引对齐
+        self._index_ready = False
+        self._warm_thread = None
+        # ==============================
 
-        # 初始化OpenAI客户端
-        self.client = OpenAI(api_key=api_key, base_url=api_base)
-
-        # 初始化ChromaDB
-        os.makedirs(db_path, exist_ok=True)
-        self.chroma_client = chromadb.PersistentClient(
-            path=db_path, settings=Settings(anonymized_telemetry=False)
-        )
+    @property
+    def client(self):
+        """共享的 OpenAI 客户端层（连接池、限流、重试）"""
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    if self.api_key == OPENAI_API_KEY and self.api_base == OPENAI_API_BASE:
+                        self._client = get_shared_client()
+                    else:
+                        self._client = SharedClient(api_key=self.api_key, api_base=self.api_base)
+        return self._client
+
+    @property
+    def chroma_client(self):
+        if self._chroma_client is None:
+            with self._init_lock:
+                if self._chroma_client is None:
+                    import chromadb
+                    from chromadb.config import Settings
+                    os.makedirs(self.db_path, exist_ok=True)
+                    self._chroma_client = chromadb.PersistentClient(
+                        path=self.db_path, settings=Settings(anonymized_telemetry=False)
+                    )
+        return self._chroma_client
 
+    @property
+    def collection(self):
         # 获取或创建collection
-        self.collection = self.chroma_client.get_or_create_collection(
-            name=collection_name, metadata={"description": "课程材料向量数据库"}
-        )
+        if self._collection is None:
+            with self._init_lock:
+                if self._collection is None:
+                    self._collection = self.chroma_client.get_or_create_collection(
+                        name=self.collection_name, metadata={"description": "课程材料向量数据库"}
+                    )
+        return self._collection
+
+    @collection.setter
+    def collection(self, value):
+        self._collection = value
+
+    def load_tokenizer(self) -> None:
+        """加载 jieba 词典（首次分词时 jieba 也会自动加载，这里用于预热）"""
+        import jieba
+        jieba.initialize()
+
+    def _tokenize(self, text: str) -> List[str]:
+        import jieba
+        return list(jieba.cut_for_search(text))
+
+    def ensure_index(self, verbose: bool = True) -> None:
+        """确保 BM25（及扁平向量）索引已构建，多线程下只构建一次"""
+        if self._index_ready:
+            return
+        with self._init_lock:
+            if not self._index_ready:
+                self._build_bm25_index(verbose=verbose)
+
+    def warm_up(self) -> threading.Thread:
+        """在后台线程中导入依赖、打开数据库并构建索引，用户输入问题时即可完成预热"""
+        def _warm():
+            try:
+                self.client.client
+                self.load_tokenizer()
+                self.ensure_index(verbose=False)
+            except Exception as e:
+                print(f"后台预热失败，将在首次检索时重试: {e}")
+
+        self._warm_thread = threading.Thread(target=_warm, name="vector-store-warm-up", daemon=True)
+        self._warm_thread.start()
+        return self._warm_thread
+
+    def _iter_pages(self, include: List[str], page_size: int = 5000):
+        """分页读取 ChromaDB 中的全部记录，避免一次性把整个库转成 Python 列表"""
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=include)
+            yield page
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+
+    def _iter_collection(self, page_size: int = 5000):
+        for page in self._iter_pages(["documents", "metadatas"], page_size):
+            for idx, doc_id in enumerate(page["ids"]):
+                yield doc_id, page["documents"][idx], page["metadatas"][idx] or {}
+
+    def _build_bm25_index(self, verbose: bool = True):
+        """[创新点] 从 ChromaDB 加载所有文档，构建列式语义块缓存与 BM25 索引"""
+        if verbose:
+            print("正在加载文档以构建混合检索索引(BM25)...")
+
+        chunks = ChunkStore()
+
+        def tokenized_corpus():
+            for doc_id, doc_text, doc_meta in self._iter_collection():
+                # 存入列式缓存，方便后续根据行号找回内容
+                chunks.append(doc_id, doc_text, doc_meta)
+                # 对文本进行分词（BM25需要分词后的列表）
+                yield self._tokenize(doc_text)
 
-        # === 创新点：初始化 BM25 索引 ===
-        self.bm25 = None
-        self.documents_cache = []  # 用于内存中存储文档内容以供BM25检索
-        self._build_bm25_index()   # 构建索引
-        # ==============================
+        bm25 = BM25Index().build(tokenized_corpus())
+        chunks.freeze()
 
-    def _build_bm25_index(self):
-        """[创新点] 从 ChromaDB 加载所有文档并在内存中构建 BM25 索引"""
-        print("正在加载文档以构建混合检索索引(BM25)...")
-        # 获取数据库中所有文档
-        all_docs = self.collection.get()
-        
-        if all_docs and all_docs['documents']:
-            self.documents_cache = []
-            tokenized_corpus = []
-            
-            # 整理数据格式
-            count = len(all_docs['documents'])
-            for idx in range(count):
-                doc_text = all_docs['documents'][idx]
-                doc_meta = all_docs['metadatas'][idx]
-                doc_id = all_docs['ids'][idx]
-                
-                # 存入缓存，方便后续根据索引找回内容
-                self.documents_cache.append({
+        if len(chunks):
+            self.chunks, self.bm25 = chunks, bm25
+            if verbose:
+                print(f"混合检索索引构建完成，包含 {len(chunks)} 个文档块。")
+
+            if self.flat_index is not None:
+                self._build_flat_index(list(chunks.ids()), verbose=verbose)
+        elif verbose:
+            print("警告：数据库为空，跳过 BM25 索引构建。")
+        self._index_ready = True
+
+    def _build_flat_index(self, ids: List[str], verbose: bool = True) -> None:
+        """加载与当前文档顺序一致的扁平索引，不一致时从 ChromaDB 取向量重建"""
+        if self.flat_index.load() and self.flat_index.ids == list(ids):
+            return
+        if verbose:
+            print("正在构建扁平向量索引...")
+        # ChromaDB 按存储顺序返回记录，与 ids 的顺序不一定一致，需按 id 重新排列
+        row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+        embeddings = [None] * len(ids)
+        for page in self._iter_pages(["embeddings"]):
+            for doc_id, embedding in zip(page["ids"], page["embeddings"]):
+                row = row_of.get(doc_id)
+                if row is not None:
+                    embeddings[row] = embedding
+        if any(embedding is None for embedding in embeddings):
+            print("警告：部分文档缺少向量，跳过扁平向量索引构建。")
+            self.flat_index.clear()
+            return
+        self.flat_index.build(ids, embeddings)
+        if verbose:
+            print(f"扁平向量索引构建完成 ({self.flat_index.dtype}, {self.flat_index.memory_bytes() / 2**20:.1f} MiB)。")
+
+    def _fetch_embeddings(self, ids: List[str]) -> List[List[float]]:
+        """按 id 顺序从 ChromaDB 取原始精度向量，用于 int8 候选重打分"""
+        res = self.collection.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(res["ids"], res["embeddings"]))
+        return [by_id[doc_id] for doc_id in ids]
+
+    def _dense_search(self, query_embedding: List[float], n_results: int) -> List[Dict]:
+        """稠密检索，按相似度排序。扁平索引只返回 {id, row, similarity}，内容在最终 top-k 时再从 chunks 取出"""
+        results = []
+        # 扁平索引缺失或与 chunks 不一致时退回 ChromaDB 检索
+        if self.flat_index is not None and len(self.flat_index) == len(self.chunks):
+            rescore = FLAT_INDEX_RESCORE if self.flat_index.dtype == "int8" else 1
+            hits = self.flat_index.search(
+                query_embedding, n_results,
+                rescore_factor=rescore,
+                fetch_embeddings=self._fetch_embeddings if rescore > 1 else None,
+            )
+            for row, similarity in hits:
+                results.append({"id": self.chunks.id(row), "row": row, "similarity": similarity})
+            return results
+
+        chroma_res = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results
+        )
+        if chroma_res["ids"]:
+            for i, doc_id in enumerate(chroma_res["ids"][0]):
+                results.append({
                     "id": doc_id,
-                    "content": doc_text,
-                    "metadata": doc_meta
+                    "content": chroma_res["documents"][0][i],
+                    "metadata": chroma_res["metadatas"][0][i],
+                    # collection 使用默认的 l2 空间（平方欧氏距离）；embedding 已归一化，1 - d/2 即余弦相似度，
+                    # 与扁平索引的分数一致，可跨分片比较
+                    "similarity": 1 - chroma_res["distances"][0][i] / 2,
                 })
-                
-                # 对文本进行分词（BM25需要分词后的列表）
-                tokens = list(jieba.cut_for_search(doc_text))
-                tokenized_corpus.append(tokens)
-            
-            # 构建 BM25 对象
-            self.bm25 = BM25Okapi(tokenized_corpus)
-            print(f"混合检索索引构建完成，包含 {count} 个文档块。")
-        else:
-            print("警告：数据库为空，跳过 BM25 索引构建。")
+        return results
 
     def get_embedding(self, text: str) -> List[float]:
         """获取文本的向量表示"""
@@ -95,7 +261,7 @@ class VectorStore:
 
         try:
             text = text.replace("\n", " ")
-            response = self.client.embeddings.create(
+            response = self.client.create_embedding(
                 input=text,
                 model=OPENAI_EMBEDDING_MODEL
             )
@@ -114,6 +280,8 @@ class VectorStore:
         total_chunks = len(chunks)
         
         print(f"开始处理 {total_chunks} 个文档块，分批存入向量数据库...")
+        stored = 0
+        failed = 0
 
         for i in range(0, total_chunks, batch_size):
             batch_chunks = chunks[i : i + batch_size]
@@ -130,6 +298,7 @@ class VectorStore:
 
                 embedding = self.get_embedding(content)
                 if not embedding:
+                    failed += 1
                     continue
 
                 safe_filename = chunk.get("filename", "unknown").replace(" ", "_")
@@ -152,88 +321,92 @@ class VectorStore:
                         metadatas=metadatas,
                         embeddings=embeddings
                     )
+                    stored += len(ids)
                 except Exception as e:
                     print(f"批量写入ChromaDB失败: {e}")
 
-        print(f"成功将 {total_chunks} 个文档块存入向量数据库。")
+        print(f"成功将 {stored}/{total_chunks} 个文档块存入向量数据库。")
+        if failed:
+            print(f"警告：{failed} 个文档块重试后仍未获取到Embedding。")
+        print(f"API调用统计: {self.client.format_stats()}")
         # 添加完数据后，重新构建BM25索引
-        self._build_bm25_index()
+        with self._init_lock:
+            if stored:
+                self._remove_flat_index()
+            self._build_bm25_index()
+
+    def search_candidates(
+        self, query: str, n: int, query_embedding: Optional[List[float]] = None
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """混合检索的两路候选：向量检索结果（按 similarity 降序）与 BM25 结果（按得分降序），均最多 n 个
+
+        BM25 结果带 bm25_score：得分除以该查询在本库中的得分上界，多分片合并时可以跨分片比较。
+        """
+        self.ensure_index()
 
-    def hybrid_search(self, query: str, top_k: int = TOP_K) -> List[Dict]:
-        """[创新点] 混合检索：结合 Vector Search 和 BM25 Search"""
-        
         # 1. 向量检索 (Vector Search)
-        query_embedding = self.get_embedding(query)
-        vector_results = []
-        if query_embedding:
-            chroma_res = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k * 2 #以此获取更多候选项用于融合
-            )
-            if chroma_res["ids"]:
-                for i, doc_id in enumerate(chroma_res["ids"][0]):
-                    vector_results.append({
-                        "id": doc_id,
-                        "content": chroma_res["documents"][0][i],
-                        "metadata": chroma_res["metadatas"][0][i],
-                        "score": 1 / (i + 60) # RRF 评分部分
-                    })
+        if query_embedding is None:
+            query_embedding = self.get_embedding(query)
+        vector_results = self._dense_search(query_embedding, n) if query_embedding else []
 
         # 2. 关键词检索 (BM25 Search)
         bm25_results = []
         if self.bm25:
-            tokenized_query = list(jieba.cut_for_search(query))
-            # 获取 BM25 分数
-            doc_scores = self.bm25.get_scores(tokenized_query)
-            # 获取分数最高的索引
-            top_n = min(len(doc_scores), top_k * 2)
-            # argsort 得到的是从小到大，这里取最后 top_n 个并反转
-            top_indices = sorted(range(len(doc_scores)), key=lambda i: doc_scores[i], reverse=True)[:top_n]
-            
-            for rank, idx in enumerate(top_indices):
-                # 过滤掉得分为0的相关性极低结果
-                if doc_scores[idx] > 0:
-                    cached_doc = self.documents_cache[idx]
-                    bm25_results.append({
-                        "id": cached_doc["id"],
-                        "content": cached_doc["content"],
-                        "metadata": cached_doc["metadata"],
-                        "score": 1 / (rank + 60) # RRF 评分部分
-                    })
-
-        # 3. RRF 融合 (Reciprocal Rank Fusion)
-        # 算法公式：Score = 1 / (rank + k)，取k=60
-        combined_scores = {}
-        all_docs_map = {}
-
-        # 处理向量结果
-        for item in vector_results:
-            doc_id = item["id"]
-            combined_scores[doc_id] = combined_scores.get(doc_id, 0) + item["score"]
-            all_docs_map[doc_id] = item
-
-        # 处理 BM25 结果
-        for item in bm25_results:
-            doc_id = item["id"]
-            combined_scores[doc_id] = combined_scores.get(doc_id, 0) + item["score"]
-            # 如果是纯关键词搜出来的，补全文档信息
-            if doc_id not in all_docs_map:
-                all_docs_map[doc_id] = item
-
-        # 4. 排序并取 Top-K
-        sorted_ids = sorted(combined_scores.keys(), key=lambda x: combined_scores[x], reverse=True)[:top_k]
-        
+            tokenized_query = self._tokenize(query)
+            # 取分数最高的 n 个行号（已过滤掉得分为0的相关性极低结果）
+            top = self.bm25.top_n_scored(tokenized_query, n)
+            max_score = self.bm25.max_score(tokenized_query) if top else 0.0
+            for row, score in top:
+                bm25_results.append({"id": self.chunks.id(row), "row": row, "bm25_score": score / max_score})
+        return vector_results, bm25_results
+
+    def materialize(self, item: Dict) -> Dict:
+        """把检索候选组装成 {content, metadata}，行号形式的候选此时才从 chunks 取出内容"""
+        if "row" in item:
+            doc = self.chunks.get(item["row"])
+            return {"content": doc["content"], "metadata": doc["metadata"]}
+        return {"content": item["content"], "metadata": item["metadata"]}
+
+    def hybrid_search(self, query: str, top_k: int = TOP_K, query_embedding: Optional[List[float]] = None) -> List[Dict]:
+        """[创新点] 混合检索：结合 Vector Search 和 BM25 Search"""
+        # 以此获取更多候选项用于融合
+        vector_results, bm25_results = self.search_candidates(query, top_k * 2, query_embedding)
+
+        # 3. RRF 融合，排序并取 Top-K
+        fused = rrf_fuse(
+            [[(item["id"], item) for item in vector_results], [(item["id"], item) for item in bm25_results]],
+            top_k,
+        )
+
         final_results = []
-        for doc_id in sorted_ids:
-            doc = all_docs_map[doc_id]
-            final_results.append({
-                "content": doc["content"],
-                "metadata": doc["metadata"],
-                "score": combined_scores[doc_id] # 这里的 score 是融合后的 RRF score
-            })
+        for item, score in fused:
+            # 只为最终结果组装内容与元数据
+            doc = self.materialize(item)
+            doc["score"] = score  # 这里的 score 是融合后的 RRF score
+            final_results.append(doc)
 
         return final_results
 
+    @staticmethod
+    def _merge_overlapping(parts: List[str], max_overlap: int = 2 * CHUNK_OVERLAP, min_overlap: int = 5) -> str:
+        """按顺序拼接同一页的语义块，去掉相邻块之间 chunk_overlap 造成的重复文本
+        （过短的首尾重合多半是巧合，不视为重叠）"""
+        text = ""
+        for part in parts:
+            limit = min(len(text), len(part), max_overlap)
+            overlap = next((k for k in range(limit, min_overlap - 1, -1) if text.endswith(part[:k])), 0)
+            text += part[overlap:]
+        return text
+
+    def get_page(self, filename: str, page_number: int) -> Optional[str]:
+        """从内存中的语义块拼出整页文本，该页不在本库中时返回 None"""
+        self.ensure_index()
+        chunks = self.chunks
+        rows = chunks.page_rows(filename, page_number)
+        if not rows:
+            return None
+        return self._merge_overlapping([chunks.content(row) for row in rows])
+
     def search(self, query: str, top_k: int = TOP_K) -> List[Dict]:
         """覆盖原有的search方法，改用混合检索"""
         return self.hybrid_search(query, top_k)
@@ -241,17 +414,42 @@ class VectorStore:
     def clear_collection(self) -> None:
         """清空collection"""
         try:
+            self.collection  # collection 延迟创建，先确保其存在再删除
             self.chroma_client.delete_collection(name=self.collection_name)
             self.collection = self.chroma_client.create_collection(
                 name=self.collection_name, metadata={"description": "课程向量数据库"}
             )
             # 清空缓存
             self.bm25 = None
-            self.documents_cache = []
+            self.chunks = ChunkStore()
+            self._index_ready = True
+            self._remove_flat_index()
             print("向量数据库已清空")
         except Exception as e:
             print(f"清空数据库时出错: {e}")
 
+    def drop_collection(self) -> None:
+        """删除collection及其扁平索引（分片下线时使用）"""
+        try:
+            self.chroma_client.delete_collection(name=self.collection_name)
+        except Exception as e:
+            print(f"删除collection时出错: {e}")
+        self._collection = None
+        self.bm25 = None
+        self.chunks = ChunkStore()
+        self._index_ready = False
+        self._remove_flat_index()
+
+    def _remove_flat_index(self) -> None:
+        """collection 内容变化后删除磁盘上的扁平索引，不论当前使用哪种稠密检索后端
+
+        语义块 id 由文件名、页码与块序号组成，文件修改后 id 往往不变，load() 时按 id 比对发现不了
+        向量已过期；以 chroma 后端重建后再切回 flat 时，也不能沿用旧的索引文件。
+        """
+        if self.flat_index is not None:
+            self.flat_index.clear()
+        shutil.rmtree(self.flat_index_dir, ignore_errors=True)
+
     def get_collection_count(self) -> int:
         """获取collection中的文档数量"""
         return self.collection.count()